@@ -1,123 +1,326 @@
 import asyncio
+import contextlib
+import hashlib
 import json
 import logging
+import re
+import time
+from collections import Counter
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from enum import Enum
+from typing import Dict, List, Optional, Tuple, Any, AsyncIterator, Awaitable, Callable
+import httpx
 import openai
-from tenacity import retry, stop_after_attempt, wait_exponential
+import orjson
+from tenacity import retry, stop_after_attempt, wait_exponential_jitter, retry_if_exception_type
 
-from config import settings, AGENT_ROLES, PROMPT_TEMPLATES, NOVEL_CONFIG
+from config import settings, agent_system_prompt, genre_style
 from models import (
     NovelRequest, NovelResult, NovelOutline, Chapter, ChapterOutline,
     AgentRole, AgentMessage, AgentResponse, NovelStatus, NovelTask
 )
 from redis_cache import RedisCache
+from text_utils import count_words, text_digest_cache
 
 logger = logging.getLogger(__name__)
 
 
+def _loads(s: str) -> Any:
+    """解析JSON（orjson）"""
+    return orjson.loads(s)
+
+
+_TRAILING_COMMA_RE = re.compile(r',\s*([}\]])')
+
+
+def _extract_json_object(s: str) -> Optional[str]:
+    """从LLM输出中截取第一个完整的 {...} 块（跳过```json围栏和前后说明文字）"""
+    start = s.find('{')
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(s)):
+        ch = s[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return s[start:i + 1]
+    return None
+
+
+def _loads_llm_json(s: str) -> Any:
+    """解析LLM返回的JSON，容忍围栏、前后说明文字和尾随逗号，避免为格式问题重新调用LLM"""
+    try:
+        return _loads(s)
+    except json.JSONDecodeError as e:
+        error = e
+
+    extracted = _extract_json_object(s)
+    if extracted is None:
+        raise error
+
+    try:
+        return _loads(extracted)
+    except json.JSONDecodeError:
+        pass
+
+    try:
+        return _loads(_TRAILING_COMMA_RE.sub(r'\1', extracted))
+    except json.JSONDecodeError:
+        raise error
+
+
+def _dumps(o: Any) -> str:
+    """序列化为缩进JSON，中文不转义（orjson始终输出UTF-8）"""
+    return orjson.dumps(o, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _compact(o: Any) -> str:
+    """序列化为紧凑JSON，用于拼接提示词（缩进会显著增加token数）"""
+    return orjson.dumps(o, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+_METRICS_RE = re.compile(r'[“”"\n]')
+@text_digest_cache(maxsize=64)
+def _content_metrics(content: str) -> Tuple[int, int]:
+    """一次扫描统计引号数和非空段落数，返回 (dialogue_count, paragraph_count)（按正文摘要缓存）"""
+    counts = Counter(m.group() for m in _METRICS_RE.finditer(content))
+    dialogue_count = counts['“'] + counts['”'] + counts['"']
+    paragraph_count = sum(1 for p in content.split('\n', counts['\n']) if p.strip())
+    return dialogue_count, paragraph_count
+
+
+class CircuitState(str, Enum):
+    """熔断器状态"""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时快速失败"""
+    pass
+
+
+class CircuitBreaker:
+    """LLM端点熔断器
+
+    连续失败达到阈值后打开，冷却期内直接拒绝调用；冷却结束后进入半开状态，
+    只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self.failure_threshold = failure_threshold or settings.LLM_BREAKER_FAILURE_THRESHOLD
+        self.reset_timeout = reset_timeout or settings.LLM_BREAKER_RESET_TIMEOUT
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.last_open_ts = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self):
+        """调用前检查，熔断时抛出CircuitOpenError"""
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self.last_open_ts < self.reset_timeout:
+                raise CircuitOpenError("LLM服务熔断中，请稍后重试")
+            self.state = CircuitState.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == CircuitState.HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError("LLM服务熔断探测中，请稍后重试")
+            self._probe_in_flight = True
+
+    def release_probe(self):
+        """调用被取消（未得到结果）时释放探测名额，不改变熔断状态，下一次调用可重新探测"""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        """记录成功调用"""
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """记录失败调用"""
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == CircuitState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != CircuitState.OPEN:
+                logger.warning(f"LLM熔断器打开（连续失败{self.consecutive_failures}次）")
+            self.state = CircuitState.OPEN
+            self.last_open_ts = time.monotonic()
+
+
+# 只对限流和连接错误重试，带抖动避免重试风暴
+_llm_retry = retry(
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=1, max=10, jitter=2),
+    retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError)),
+    reraise=True
+)
+
+
 class AIAgent:
     """AI Agent基类"""
 
-    def __init__(self, role: AgentRole, api_key: str, base_url: str = None):
+    def __init__(self, role: AgentRole, client: openai.AsyncOpenAI,
+                 semaphore: asyncio.Semaphore = None, cache: RedisCache = None,
+                 breaker: CircuitBreaker = None):
         self.role = role
-        self.api_key = api_key
-        self.base_url = base_url or settings.OPENAI_BASE_URL
         self.model = settings.OPENAI_MODEL
         self.temperature = settings.OPENAI_TEMPERATURE
         self.max_tokens = settings.OPENAI_MAX_TOKENS
 
-        # 设置OpenAI客户端
-        openai.api_key = api_key
-        if base_url:
-            openai.api_base = base_url
+        # 所有Agent共用生成器创建的客户端及其连接池，凭据只在客户端上配置一次
+        self.client = client
+        # 限制并发调用数，避免触发速率限制
+        self.semaphore = semaphore or asyncio.Semaphore(settings.AGENT_CONCURRENCY)
+        self.breaker = breaker or CircuitBreaker()
+
+        # LLM响应缓存：精确匹配走Redis，语义缓存由生成器按需注入
+        self.cache = cache
+        self.semantic_cache = None
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    async def call_llm(self, messages: List[Dict], temperature: float = None) -> str:
+        # 系统提示词是静态的，构造时取一次
+        self.system_prompt = agent_system_prompt(role.value)
+
+    @_llm_retry
+    async def call_llm(self, messages: List[Dict], temperature: float = None,
+                       max_tokens: int = None) -> str:
         """调用LLM API"""
+        temperature = temperature or self.temperature
+
+        # 只缓存低温度（输出稳定）的调用，创作类调用每次都需要新内容
+        cacheable = self.cache is not None and temperature <= settings.LLM_CACHE_MAX_TEMPERATURE
+        if cacheable:
+            cache_key = self._llm_cache_key(messages, temperature)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            if self.semantic_cache is not None:
+                hits = await asyncio.to_thread(self.semantic_cache.check, prompt=messages[-1]["content"])
+                if hits:
+                    return hits[0]["response"]
+
         try:
-            response = await openai.ChatCompletion.acreate(
-                model=self.model,
-                messages=messages,
-                temperature=temperature or self.temperature,
-                max_tokens=self.max_tokens
-            )
-            return response.choices[0].message.content
+            async with self.semaphore:
+                self.breaker.before_call()
+                try:
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        max_tokens=max_tokens or self.max_tokens
+                    )
+                except Exception:
+                    self.breaker.record_failure()
+                    raise
+                except BaseException:
+                    # 取消（CancelledError）不代表服务异常，但必须释放探测名额，否则半开状态永远无法恢复
+                    self.breaker.release_probe()
+                    raise
+                self.breaker.record_success()
+            content = response.choices[0].message.content
         except Exception as e:
             logger.error(f"LLM API调用失败 ({self.role}): {e}")
             raise
 
+        if cacheable:
+            self.cache.set(cache_key, content, settings.RESULT_CACHE_TTL)
+            if self.semantic_cache is not None:
+                await asyncio.to_thread(self.semantic_cache.store, prompt=messages[-1]["content"], response=content)
+
+        return content
+
+    async def call_llm_stream(self, messages: List[Dict], temperature: float = None) -> AsyncIterator[str]:
+        """流式调用LLM API，逐段产出文本"""
+        async with self.semaphore:
+            self.breaker.before_call()
+            try:
+                stream = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature or self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except Exception as e:
+                self.breaker.record_failure()
+                logger.error(f"LLM流式调用失败 ({self.role}): {e}")
+                raise
+            except BaseException:
+                # 被取消或调用方提前关闭生成器（GeneratorExit）时释放探测名额
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+
+    @_llm_retry
+    async def stream_llm(self, messages: List[Dict], temperature: float = None,
+                         on_progress: Callable[[int], Awaitable[None]] = None) -> str:
+        """流式调用LLM并拼接完整文本，每收到一段回调一次已生成字符数"""
+        parts = []
+        received = 0
+        async for delta in self.call_llm_stream(messages, temperature):
+            parts.append(delta)
+            received += len(delta)
+            if on_progress:
+                await on_progress(received)
+        return "".join(parts)
+
+    def _llm_cache_key(self, messages: List[Dict], temperature: float) -> str:
+        """生成LLM响应缓存键"""
+        payload = orjson.dumps(
+            {"model": self.model, "messages": messages, "t": temperature},
+            option=orjson.OPT_SORT_KEYS
+        )
+        return "llm:" + hashlib.sha256(payload).hexdigest()
+
     async def process(self, context: Dict[str, Any]) -> AgentResponse:
         """处理任务并返回响应"""
         raise NotImplementedError
 
     def get_system_prompt(self) -> str:
         """获取系统提示词"""
-        return PROMPT_TEMPLATES["system_prompts"].get(self.role.value, "")
-
-
-class PlannerAgent(AIAgent):
-    """策划师Agent - 负责故事策划和大纲设计"""
-
-    async def process(self, context: Dict[str, Any]) -> AgentResponse:
-        """生成故事大纲"""
-        request: NovelRequest = context["request"]
-
-        # 构建策划提示词
-        prompt = self._build_planning_prompt(request)
-
-        messages = [
-            {"role": "system", "content": self.get_system_prompt()},
-            {"role": "user", "content": prompt}
-        ]
-
-        try:
-            response_content = await self.call_llm(messages, temperature=0.7)
-            outline_data = json.loads(response_content)
-
-            # 验证和补充大纲数据
-            outline = self._validate_and_enhance_outline(outline_data, request)
-
-            return AgentResponse(
-                agent_role=self.role,
-                content=json.dumps(outline.dict(), ensure_ascii=False, indent=2),
-                quality_score=self._evaluate_outline_quality(outline),
-                suggestions=self._generate_planning_suggestions(outline),
-                next_action="begin_writing",
-                metadata={"outline_created": True, "chapter_count": len(outline.chapter_outlines)}
-            )
+        return self.system_prompt
 
-        except json.JSONDecodeError as e:
-            logger.error(f"大纲解析失败: {e}")
-            # 重试或返回错误
-            raise Exception(f"大纲格式错误: {e}")
-        except Exception as e:
-            logger.error(f"策划过程出错: {e}")
-            raise
-
-    def _build_planning_prompt(self, request: NovelRequest) -> str:
-        """构建策划提示词"""
-        genre_info = NOVEL_CONFIG["genres"].get(request.genre.value if request.genre else "urban_romance", {})
 
-        prompt = f"""
+_PLANNING_PROMPT_TEMPLATE = """
 请为以下需求创作一个完整的小说大纲：
 
 **创作需求：**
-- 主题：{request.theme}
-- 类型：{request.genre.value if request.genre else "自动判断"} - {genre_info.get("description", "")}
-- 风格：{request.style.value}
-- 目标字数：{request.word_count}字
-- 章节数：{request.chapter_count}章
-- 目标读者：{request.target_audience}
+- 主题：{theme}
+- 类型：{genre_label} - {genre_desc}
+- 风格：{style}
+- 目标字数：{word_count}字
+- 章节数：{chapter_count}章
+- 目标读者：{target_audience}
 
 **类型特色：**
-{json.dumps(genre_info.get("style_prompts", {}), ensure_ascii=False, indent=2)}
+{genre_prompts}
 
 请生成严格的JSON格式大纲，包含以下结构：
 {{
     "title": "吸引人的标题",
     "subtitle": "副标题（可选）",
-    "author_note": "作者的话（100字内，{request.style.value}）",
+    "author_note": "作者的话（100字内，{style}）",
     "one_line_pitch": "一句话介绍这个故事",
     "genre": "具体细分类型",
     "theme": "核心主题",
@@ -168,26 +371,82 @@ class PlannerAgent(AIAgent):
             "key_events": ["事件1", "事件2"],
             "characters_involved": ["角色1", "角色2"],
             "mood": "章节氛围",
-            "target_word_count": {request.word_count // request.chapter_count}
+            "target_word_count": {chapter_word_count}
         }}
-        // ... 共{request.chapter_count}章
+        // ... 共{chapter_count}章
     ],
 
     "themes_to_explore": ["主题1", "主题2", "主题3"],
     "key_symbols": ["象征1", "象征2"],
-    "target_readers": "{request.target_audience}"
+    "target_readers": "{target_audience}"
 }}
 
 **创作要求：**
 1. 故事要有强烈的冲突和张力
 2. 人物要立体可信，有成长弧线
-3. 适合{request.target_audience}的阅读习惯
+3. 适合{target_audience}的阅读习惯
 4. 每章都要有明确的目标和进展
 5. 整体结构要完整且引人入胜
 
 请确保返回的是完整、有效的JSON格式。
 """
-        return prompt
+
+
+class PlannerAgent(AIAgent):
+    """策划师Agent - 负责故事策划和大纲设计"""
+
+    async def process(self, context: Dict[str, Any]) -> AgentResponse:
+        """生成故事大纲"""
+        request: NovelRequest = context["request"]
+
+        # 构建策划提示词
+        prompt = self._build_planning_prompt(request)
+
+        messages = [
+            {"role": "system", "content": self.get_system_prompt()},
+            {"role": "user", "content": prompt}
+        ]
+
+        try:
+            response_content = await self.call_llm(messages, temperature=0.7)
+            outline_data = _loads_llm_json(response_content)
+
+            # 验证和补充大纲数据
+            outline = self._validate_and_enhance_outline(outline_data, request)
+
+            return AgentResponse(
+                agent_role=self.role,
+                content=_dumps(outline.dict()),
+                obj=outline,
+                quality_score=self._evaluate_outline_quality(outline),
+                suggestions=self._generate_planning_suggestions(outline),
+                next_action="begin_writing",
+                metadata={"outline_created": True, "chapter_count": len(outline.chapter_outlines)}
+            )
+
+        except json.JSONDecodeError as e:
+            logger.error(f"大纲解析失败: {e}")
+            # 重试或返回错误
+            raise Exception(f"大纲格式错误: {e}")
+        except Exception as e:
+            logger.error(f"策划过程出错: {e}")
+            raise
+
+    def _build_planning_prompt(self, request: NovelRequest) -> str:
+        """构建策划提示词"""
+        genre_desc, genre_prompts = genre_style(request.genre.value if request.genre else "urban_romance")
+
+        return _PLANNING_PROMPT_TEMPLATE.format_map({
+            "theme": request.theme,
+            "genre_label": request.genre.value if request.genre else "自动判断",
+            "genre_desc": genre_desc,
+            "style": request.style.value,
+            "word_count": request.word_count,
+            "chapter_count": request.chapter_count,
+            "chapter_word_count": request.word_count // request.chapter_count,
+            "target_audience": request.target_audience,
+            "genre_prompts": genre_prompts,
+        })
 
     def _validate_and_enhance_outline(self, outline_data: Dict, request: NovelRequest) -> NovelOutline:
         """验证和增强大纲数据"""
@@ -275,9 +534,70 @@ class PlannerAgent(AIAgent):
         return suggestions
 
 
+_WRITING_PROMPT_TEMPLATE = """
+请根据以下信息创作第{chapter_num}章的内容：
+
+**故事概况：**
+- 标题：{title}
+- 主题：{theme}
+- 基调：{tone}
+- 一句话概括：{one_line_pitch}
+
+**人物设定：**
+{characters_json}
+
+**世界观设定：**
+{world_json}
+
+**本章大纲：**
+- 章节：{chapter_title}
+- 概要：{chapter_summary}
+- 关键事件：{key_events}
+- 涉及角色：{characters_involved}
+- 氛围：{mood}
+- 目标字数：{target_word_count}字
+
+**前情回顾：**
+{previous_summary}
+
+**创作要求：**
+1. 字数控制在{min_word_count}到{max_word_count}字之间
+2. 保持人物性格的一致性
+3. 推进主要情节，实现章节目标
+4. 使用丰富的对话推进剧情（对话比例30-40%）
+5. 加入感官细节，增强画面感
+6. 保持{tone}的整体基调
+7. 如果不是最后一章，要在结尾留下悬念
+
+**风格特点：**
+- 语言现代流畅，适合现代读者
+- 避免过度修饰，保持可读性
+- 适当融入思考性内容
+- 节奏张弛有度
+
+请直接输出章节内容，不要添加任何额外的解释或标记。
+"""
+
+
+_SUMMARY_SYSTEM_PROMPT = "你是一位小说编辑，擅长提炼剧情要点。"
+
+_SUMMARY_PROMPT_TEMPLATE = """
+请用100字以内概括以下章节的剧情，包括关键事件、人物状态变化和留下的悬念：
+
+**章节：**{chapter_title}
+
+**内容：**
+{content}
+
+请直接输出摘要，不要添加任何额外的解释或标记。
+"""
+
+
 class WriterAgent(AIAgent):
     """创作者Agent - 负责具体内容创作"""
 
+    _outline_json_cache: Optional[Tuple[NovelOutline, str, str]] = None
+
     async def process(self, context: Dict[str, Any]) -> AgentResponse:
         """创作章节内容"""
         outline: NovelOutline = context["outline"]
@@ -298,14 +618,15 @@ class WriterAgent(AIAgent):
         ]
 
         try:
-            content = await self.call_llm(messages, temperature=0.85)
+            content = await self.stream_llm(messages, temperature=0.85,
+                                            on_progress=context.get("on_progress"))
 
             # 创建章节对象
             chapter = Chapter(
                 chapter_num=chapter_num,
                 title=chapter_outline.title,
                 content=content,
-                word_count=len(content.split())
+                word_count=count_words(content)
             )
 
             # 评估内容质量
@@ -313,7 +634,8 @@ class WriterAgent(AIAgent):
 
             return AgentResponse(
                 agent_role=self.role,
-                content=json.dumps(chapter.dict(), ensure_ascii=False, indent=2),
+                content=content,
+                obj=chapter,
                 quality_score=quality_score,
                 suggestions=self._generate_writing_suggestions(chapter, chapter_outline),
                 next_action="review_content",
@@ -331,69 +653,75 @@ class WriterAgent(AIAgent):
     def _build_writing_prompt(self, outline: NovelOutline, chapter_outline: ChapterOutline,
                               previous_chapters: List[Chapter]) -> str:
         """构建创作提示词"""
-        # 获取前情提要
-        previous_summary = self._generate_previous_summary(previous_chapters)
-
-        prompt = f"""
-请根据以下信息创作第{chapter_outline.chapter_num}章的内容：
-
-**故事概况：**
-- 标题：{outline.title}
-- 主题：{outline.theme}
-- 基调：{outline.tone}
-- 一句话概括：{outline.one_line_pitch}
-
-**人物设定：**
-{json.dumps(outline.characters, ensure_ascii=False, indent=2)}
-
-**世界观设定：**
-{json.dumps(outline.world_setting, ensure_ascii=False, indent=2)}
-
-**本章大纲：**
-- 章节：{chapter_outline.title}
-- 概要：{chapter_outline.summary}
-- 关键事件：{', '.join(chapter_outline.key_events)}
-- 涉及角色：{', '.join(chapter_outline.characters_involved)}
-- 氛围：{chapter_outline.mood}
-- 目标字数：{chapter_outline.target_word_count}字
-
-**前情回顾：**
-{previous_summary}
-
-**创作要求：**
-1. 字数控制在{chapter_outline.target_word_count - 200}到{chapter_outline.target_word_count + 200}字之间
-2. 保持人物性格的一致性
-3. 推进主要情节，实现章节目标
-4. 使用丰富的对话推进剧情（对话比例30-40%）
-5. 加入感官细节，增强画面感
-6. 保持{outline.tone}的整体基调
-7. 如果不是最后一章，要在结尾留下悬念
-
-**风格特点：**
-- 语言现代流畅，适合现代读者
-- 避免过度修饰，保持可读性
-- 适当融入思考性内容
-- 节奏张弛有度
-
-请直接输出章节内容，不要添加任何额外的解释或标记。
-"""
-        return prompt
+        characters_json, world_json = self._outline_json(outline)
+
+        return _WRITING_PROMPT_TEMPLATE.format_map({
+            "chapter_num": chapter_outline.chapter_num,
+            "title": outline.title,
+            "theme": outline.theme,
+            "tone": outline.tone,
+            "one_line_pitch": outline.one_line_pitch,
+            "characters_json": characters_json,
+            "world_json": world_json,
+            "chapter_title": chapter_outline.title,
+            "chapter_summary": chapter_outline.summary,
+            "key_events": ', '.join(chapter_outline.key_events),
+            "characters_involved": ', '.join(chapter_outline.characters_involved),
+            "mood": chapter_outline.mood,
+            "target_word_count": chapter_outline.target_word_count,
+            "min_word_count": chapter_outline.target_word_count - 200,
+            "max_word_count": chapter_outline.target_word_count + 200,
+            # 获取前情提要
+            "previous_summary": self._generate_previous_summary(previous_chapters),
+        })
+
+    def _outline_json(self, outline: NovelOutline) -> Tuple[str, str]:
+        """人物和世界观的序列化结果，整部小说创作期间大纲不变，只计算一次"""
+        cached = self._outline_json_cache
+        if cached is None or cached[0] is not outline:
+            cached = (outline, _compact(outline.characters), _compact(outline.world_setting))
+            self._outline_json_cache = cached
+        return cached[1], cached[2]
 
     def _generate_previous_summary(self, previous_chapters: List[Chapter]) -> str:
         """生成前情提要"""
         if not previous_chapters:
             return "这是故事的开端。"
 
-        # 取最近的几章进行总结
-        recent_chapters = previous_chapters[-2:] if len(previous_chapters) > 2 else previous_chapters
-
+        # 从最近的章节往前拼接摘要，总长度不超过预算
+        budget = settings.AGENT_PREVIOUS_SUMMARY_MAX_CHARS
         summary_parts = []
-        for chapter in recent_chapters:
-            # 简化章节内容为摘要
-            content_excerpt = chapter.content[:200] + "..." if len(chapter.content) > 200 else chapter.content
-            summary_parts.append(f"{chapter.title}：{content_excerpt}")
+        for chapter in reversed(previous_chapters):
+            if chapter.summary:
+                part = f"{chapter.title}：{chapter.summary}"
+            else:
+                # 摘要未生成时退回到截取开头
+                content_excerpt = chapter.content[:200] + "..." if len(chapter.content) > 200 else chapter.content
+                part = f"{chapter.title}：{content_excerpt}"
+            if summary_parts and len(part) > budget:
+                break
+            summary_parts.append(part)
+            budget -= len(part)
+
+        return "\n".join(reversed(summary_parts))
+
+    async def summarize_chapter(self, chapter: Chapter) -> Optional[str]:
+        """生成章节剧情摘要，供后续章节的前情提要使用"""
+        messages = [
+            {"role": "system", "content": _SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": _SUMMARY_PROMPT_TEMPLATE.format_map({
+                "chapter_title": chapter.title,
+                "content": chapter.content,
+            })}
+        ]
 
-        return "\n".join(summary_parts)
+        try:
+            summary = await self.call_llm(messages, temperature=0.3,
+                                          max_tokens=settings.AGENT_SUMMARY_MAX_TOKENS)
+            return summary.strip()
+        except Exception as e:
+            logger.warning(f"第{chapter.chapter_num}章摘要生成失败: {e}")
+            return None
 
     def _evaluate_content_quality(self, chapter: Chapter, chapter_outline: ChapterOutline) -> float:
         """评估内容质量"""
@@ -407,15 +735,15 @@ class WriterAgent(AIAgent):
             score += 1
         total_criteria += 1
 
+        dialogue_count, paragraph_count = _content_metrics(chapter.content)
+
         # 对话比例检查（简单估算）
-        dialogue_count = chapter.content.count('"') + chapter.content.count('"') + chapter.content.count('"')
         if dialogue_count >= 6:  # 至少3轮对话
             score += 1
         total_criteria += 1
 
         # 段落结构检查
-        paragraphs = [p.strip() for p in chapter.content.split('\n') if p.strip()]
-        if len(paragraphs) >= 5:  # 至少5个段落
+        if paragraph_count >= 5:  # 至少5个段落
             score += 1
         total_criteria += 1
 
@@ -436,19 +764,67 @@ class WriterAgent(AIAgent):
         elif chapter.word_count > chapter_outline.target_word_count * 1.2:
             suggestions.append(f"内容偏长，建议精简至{chapter_outline.target_word_count}字左右")
 
+        dialogue_count, paragraph_count = _content_metrics(chapter.content)
+
         # 检查对话
-        dialogue_count = chapter.content.count('"')
         if dialogue_count < 4:
             suggestions.append("建议增加更多对话来推进情节")
 
         # 检查结构
-        paragraphs = [p.strip() for p in chapter.content.split('\n') if p.strip()]
-        if len(paragraphs) < 5:
+        if paragraph_count < 5:
             suggestions.append("建议调整段落结构，增加层次感")
 
         return suggestions
 
 
+_EDITING_PROMPT_TEMPLATE = """
+请对以下章节内容进行编辑优化：
+
+**章节信息：**
+- 章节：{chapter_title}
+- 当前字数：{word_count}
+- 在整体故事中的位置：第{chapter_num}章，共{chapter_total}章
+
+**故事背景：**
+- 故事主题：{theme}
+- 故事基调：{tone}
+- 主要人物：{character_names}
+
+**原始内容：**
+{content}
+
+**编辑要求：**
+1. **语言优化**：
+   - 删除冗余表达和重复词汇
+   - 优化句式结构，提高流畅度
+   - 增强画面感和代入感
+   - 确保语言风格统一
+
+2. **逻辑检查**：
+   - 确保情节逻辑通顺
+   - 检查时间线的一致性
+   - 保持人物性格的连贯性
+   - 与前文的衔接自然
+
+3. **对话优化**：
+   - 使对话更自然生动
+   - 确保符合人物性格
+   - 通过对话推进情节
+
+4. **细节增强**：
+   - 适当添加感官细节
+   - 强化氛围营造
+   - 优化场景转换
+
+5. **可读性提升**：
+   - 保持现代读者的阅读习惯
+   - 控制段落长度
+   - 确保节奏适宜
+
+请直接输出优化后的完整内容，不要添加解释或标记。
+"""
+
+
 class EditorAgent(AIAgent):
     """编辑Agent - 负责内容审核和优化"""
 
@@ -474,7 +850,8 @@ class EditorAgent(AIAgent):
                 chapter_num=chapter.chapter_num,
                 title=chapter.title,
                 content=edited_content,
-                word_count=len(edited_content.split()),
+                word_count=count_words(edited_content),
+                summary=chapter.summary,  # 润色不改变剧情，沿用原摘要
                 editor_notes="已优化语言表达和结构"
             )
 
@@ -483,7 +860,8 @@ class EditorAgent(AIAgent):
 
             return AgentResponse(
                 agent_role=self.role,
-                content=json.dumps(edited_chapter.dict(), ensure_ascii=False, indent=2),
+                content=edited_content,
+                obj=edited_chapter,
                 quality_score=quality_score,
                 suggestions=self._generate_editing_suggestions(edited_chapter, chapter),
                 next_action="final_review",
@@ -501,53 +879,17 @@ class EditorAgent(AIAgent):
     def _build_editing_prompt(self, chapter: Chapter, outline: NovelOutline,
                               previous_chapters: List[Chapter]) -> str:
         """构建编辑提示词"""
-        prompt = f"""
-请对以下章节内容进行编辑优化：
-
-**章节信息：**
-- 章节：{chapter.title}
-- 当前字数：{chapter.word_count}
-- 在整体故事中的位置：第{chapter.chapter_num}章，共{len(outline.chapter_outlines)}章
-
-**故事背景：**
-- 故事主题：{outline.theme}
-- 故事基调：{outline.tone}
-- 主要人物：{', '.join([char['name'] for char in [outline.characters.get('protagonist', {})] + outline.characters.get('supporting', []) if 'name' in char])}
-
-**原始内容：**
-{chapter.content}
-
-**编辑要求：**
-1. **语言优化**：
-   - 删除冗余表达和重复词汇
-   - 优化句式结构，提高流畅度
-   - 增强画面感和代入感
-   - 确保语言风格统一
-
-2. **逻辑检查**：
-   - 确保情节逻辑通顺
-   - 检查时间线的一致性
-   - 保持人物性格的连贯性
-   - 与前文的衔接自然
-
-3. **对话优化**：
-   - 使对话更自然生动
-   - 确保符合人物性格
-   - 通过对话推进情节
-
-4. **细节增强**：
-   - 适当添加感官细节
-   - 强化氛围营造
-   - 优化场景转换
-
-5. **可读性提升**：
-   - 保持现代读者的阅读习惯
-   - 控制段落长度
-   - 确保节奏适宜
-
-请直接输出优化后的完整内容，不要添加解释或标记。
-"""
-        return prompt
+        characters = [outline.characters.get('protagonist', {})] + outline.characters.get('supporting', [])
+        return _EDITING_PROMPT_TEMPLATE.format_map({
+            "chapter_title": chapter.title,
+            "word_count": chapter.word_count,
+            "chapter_num": chapter.chapter_num,
+            "chapter_total": len(outline.chapter_outlines),
+            "theme": outline.theme,
+            "tone": outline.tone,
+            "character_names": ', '.join(char['name'] for char in characters if 'name' in char),
+            "content": chapter.content,
+        })
 
     def _evaluate_editing_quality(self, edited_chapter: Chapter, original_chapter: Chapter) -> float:
         """评估编辑质量"""
@@ -561,8 +903,8 @@ class EditorAgent(AIAgent):
         total_criteria += 1
 
         # 结构改善检查
-        original_paragraphs = len([p for p in original_chapter.content.split('\n') if p.strip()])
-        edited_paragraphs = len([p for p in edited_chapter.content.split('\n') if p.strip()])
+        original_paragraphs = _content_metrics(original_chapter.content)[1]
+        edited_paragraphs = _content_metrics(edited_chapter.content)[1]
 
         if edited_paragraphs >= original_paragraphs:  # 结构保持或改善
             score += 1
@@ -592,6 +934,55 @@ class EditorAgent(AIAgent):
         return suggestions
 
 
+_CHAPTER_REVIEW_PROMPT_TEMPLATE = """
+请对以下章节内容进行专业评审：
+
+**章节目标：**
+- 标题：{outline_title}
+- 概要：{summary}
+- 关键事件：{key_events}
+- 目标字数：{target_word_count}
+- 预期氛围：{mood}
+
+**实际内容：**
+- 标题：{chapter_title}
+- 实际字数：{word_count}
+- 内容：{excerpt}...（内容较长，已截取开头）
+
+**评审维度：**
+请从以下几个维度评分（1-5分）并给出具体建议：
+
+1. **内容完整性**：是否完整实现了章节目标
+2. **情节推进**：是否有效推进了整体故事
+3. **人物刻画**：人物是否生动可信
+4. **语言质量**：文字表达是否流畅优美
+5. **节奏把控**：情节节奏是否适宜
+6. **细节描写**：场景和氛围描写是否生动
+7. **逻辑一致性**：是否与前文保持一致
+8. **可读性**：是否符合目标读者口味
+
+请返回以下JSON格式的评审报告：
+{{
+    "overall_score": 总体评分(1-5),
+    "scores": {{
+        "completeness": 完整性评分,
+        "plot_progression": 情节推进评分,
+        "character_development": 人物刻画评分,
+        "language_quality": 语言质量评分,
+        "pacing": 节奏把控评分,
+        "details": 细节描写评分,
+        "consistency": 逻辑一致性评分,
+        "readability": 可读性评分
+    }},
+    "strengths": ["优点1", "优点2", "优点3"],
+    "weaknesses": ["不足1", "不足2"],
+    "suggestions": ["改进建议1", "改进建议2", "改进建议3"],
+    "word_count_assessment": "字数评价",
+    "recommendation": "accept/revise/rewrite"
+}}
+"""
+
+
 class ReviewerAgent(AIAgent):
     """评审者Agent - 负责质量评估和反馈"""
 
@@ -607,27 +998,95 @@ class ReviewerAgent(AIAgent):
     async def _review_chapter(self, context: Dict[str, Any]) -> AgentResponse:
         """评审章节内容"""
         chapter: Chapter = context["chapter"]
+        messages = self._build_chapter_review_messages(context)
+
+        review_result = await self.call_llm(messages, temperature=0.2)
+        return self._parse_chapter_review(review_result, chapter)
+
+    async def process_batch(self, contexts: List[Dict[str, Any]]) -> List[AgentResponse]:
+        """通过OpenAI Batch API批量评审章节，结果顺序与contexts一致"""
+        lines = []
+        for context in contexts:
+            lines.append(orjson.dumps({
+                "custom_id": f"ch-{context['chapter'].chapter_num}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": self._build_chapter_review_messages(context),
+                    "temperature": 0.2,
+                    "max_tokens": self.max_tokens
+                }
+            }))
+
+        batch_file = await self.client.files.create(
+            file=("chapter_reviews.jsonl", b"\n".join(lines)),
+            purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info(f"已提交批量评审任务: {batch.id}（{len(contexts)}章）")
+
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(settings.AGENT_BATCH_POLL_INTERVAL)
+            batch = await self.client.batches.retrieve(batch.id)
+
+        if batch.status != "completed":
+            raise Exception(f"批量评审失败: {batch.id} 状态 {batch.status}")
+
+        # 按custom_id映射结果
+        results = {}
+        if batch.output_file_id:
+            output = await self.client.files.content(batch.output_file_id)
+            for line in output.text.splitlines():
+                if not line.strip():
+                    continue
+                item = _loads(line)
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+
+        responses = []
+        for context in contexts:
+            chapter: Chapter = context["chapter"]
+            review_result = results.get(f"ch-{chapter.chapter_num}")
+            if review_result is None:
+                # 批量中失败的请求单独重新评审
+                logger.warning(f"第{chapter.chapter_num}章批量评审无结果，改为单独评审")
+                responses.append(await self._review_chapter(context))
+            else:
+                responses.append(self._parse_chapter_review(review_result, chapter))
+
+        return responses
+
+    def _build_chapter_review_messages(self, context: Dict[str, Any]) -> List[Dict]:
+        """构建章节评审消息"""
+        chapter: Chapter = context["chapter"]
         outline: NovelOutline = context["outline"]
         chapter_outline = outline.chapter_outlines[chapter.chapter_num - 1]
 
         # 构建评审提示词
         prompt = self._build_chapter_review_prompt(chapter, chapter_outline, outline)
 
-        messages = [
+        return [
             {"role": "system", "content": self.get_system_prompt()},
             {"role": "user", "content": prompt}
         ]
 
+    def _parse_chapter_review(self, review_result: str, chapter: Chapter) -> AgentResponse:
+        """解析章节评审结果"""
         try:
-            review_result = await self.call_llm(messages, temperature=0.2)
-            review_data = json.loads(review_result)
+            review_data = _loads_llm_json(review_result)
 
             # 计算综合质量分数
             quality_score = self._calculate_quality_score(review_data)
 
             return AgentResponse(
                 agent_role=self.role,
-                content=json.dumps(review_data, ensure_ascii=False, indent=2),
+                content=_dumps(review_data),
                 quality_score=quality_score,
                 suggestions=review_data.get("suggestions", []),
                 next_action="accept" if quality_score >= 0.7 else "revise",
@@ -651,54 +1110,16 @@ class ReviewerAgent(AIAgent):
     def _build_chapter_review_prompt(self, chapter: Chapter, chapter_outline: ChapterOutline,
                                      outline: NovelOutline) -> str:
         """构建章节评审提示词"""
-        prompt = f"""
-请对以下章节内容进行专业评审：
-
-**章节目标：**
-- 标题：{chapter_outline.title}
-- 概要：{chapter_outline.summary}
-- 关键事件：{', '.join(chapter_outline.key_events)}
-- 目标字数：{chapter_outline.target_word_count}
-- 预期氛围：{chapter_outline.mood}
-
-**实际内容：**
-- 标题：{chapter.title}
-- 实际字数：{chapter.word_count}
-- 内容：{chapter.content[:500]}...（内容较长，已截取开头）
-
-**评审维度：**
-请从以下几个维度评分（1-5分）并给出具体建议：
-
-1. **内容完整性**：是否完整实现了章节目标
-2. **情节推进**：是否有效推进了整体故事
-3. **人物刻画**：人物是否生动可信
-4. **语言质量**：文字表达是否流畅优美
-5. **节奏把控**：情节节奏是否适宜
-6. **细节描写**：场景和氛围描写是否生动
-7. **逻辑一致性**：是否与前文保持一致
-8. **可读性**：是否符合目标读者口味
-
-请返回以下JSON格式的评审报告：
-{{
-    "overall_score": 总体评分(1-5),
-    "scores": {{
-        "completeness": 完整性评分,
-        "plot_progression": 情节推进评分,
-        "character_development": 人物刻画评分,
-        "language_quality": 语言质量评分,
-        "pacing": 节奏把控评分,
-        "details": 细节描写评分,
-        "consistency": 逻辑一致性评分,
-        "readability": 可读性评分
-    }},
-    "strengths": ["优点1", "优点2", "优点3"],
-    "weaknesses": ["不足1", "不足2"],
-    "suggestions": ["改进建议1", "改进建议2", "改进建议3"],
-    "word_count_assessment": "字数评价",
-    "recommendation": "accept/revise/rewrite"
-}}
-"""
-        return prompt
+        return _CHAPTER_REVIEW_PROMPT_TEMPLATE.format_map({
+            "outline_title": chapter_outline.title,
+            "summary": chapter_outline.summary,
+            "key_events": ', '.join(chapter_outline.key_events),
+            "target_word_count": chapter_outline.target_word_count,
+            "mood": chapter_outline.mood,
+            "chapter_title": chapter.title,
+            "word_count": chapter.word_count,
+            "excerpt": chapter.content[:500],
+        })
 
     def _calculate_quality_score(self, review_data: Dict) -> float:
         """计算质量分数"""
@@ -716,19 +1137,62 @@ class ReviewerAgent(AIAgent):
 class AgentNovelGenerator:
     """基于Agent协作的小说生成器"""
 
-    def __init__(self, api_key: str, base_url: str = None):
+    def __init__(self, api_key: str, base_url: str = None, cache: RedisCache = None):
         self.api_key = api_key
         self.base_url = base_url
-        self.cache = RedisCache()
+        # 与API进程共用同一个缓存实例（连接池、Redis不可用时的内存后备存储）
+        self.cache = cache or RedisCache()
+
+        # 所有Agent共享一个带连接池的异步客户端
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(settings.LLM_TIMEOUT)
+        )
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url or settings.OPENAI_BASE_URL,
+            http_client=self.http_client
+        )
+
+        self.llm_semaphore = asyncio.Semaphore(settings.AGENT_CONCURRENCY)
 
         # 初始化各个Agent
-        self.planner = PlannerAgent(AgentRole.PLANNER, api_key, base_url)
-        self.writer = WriterAgent(AgentRole.WRITER, api_key, base_url)
-        self.editor = EditorAgent(AgentRole.EDITOR, api_key, base_url)
-        self.reviewer = ReviewerAgent(AgentRole.REVIEWER, api_key, base_url)
+        self.breaker = CircuitBreaker()
+
+        agent_args = (self.client, self.llm_semaphore, self.cache, self.breaker)
+        self.planner = PlannerAgent(AgentRole.PLANNER, *agent_args)
+        self.writer = WriterAgent(AgentRole.WRITER, *agent_args)
+        self.editor = EditorAgent(AgentRole.EDITOR, *agent_args)
+        self.reviewer = ReviewerAgent(AgentRole.REVIEWER, *agent_args)
+
+        if settings.LLM_SEMANTIC_CACHE_ENABLED:
+            semantic_cache = self._create_semantic_cache()
+            for agent in (self.planner, self.writer, self.editor, self.reviewer):
+                agent.semantic_cache = semantic_cache
 
         logger.info("Agent小说生成器初始化完成")
 
+    def _create_semantic_cache(self):
+        """创建RedisVL语义缓存（可选依赖）"""
+        from redisvl.extensions.cache.llm import SemanticCache
+        from redisvl.utils.vectorize import HFTextVectorizer
+
+        password = f":{settings.REDIS_PASSWORD}@" if settings.REDIS_PASSWORD else ""
+        return SemanticCache(
+            name="agent_llm",
+            redis_url=f"redis://{password}{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
+            distance_threshold=settings.LLM_SEMANTIC_CACHE_THRESHOLD,
+            ttl=settings.RESULT_CACHE_TTL,
+            vectorizer=HFTextVectorizer(settings.LLM_SEMANTIC_CACHE_MODEL)
+        )
+
+    async def aclose(self):
+        """关闭共享的HTTP连接池"""
+        await self.client.close()
+
     async def generate_novel(self, request: NovelRequest, task_id: str) -> NovelResult:
         """主生成流程"""
         try:
@@ -740,7 +1204,7 @@ class AgentNovelGenerator:
             await self._update_task_status(task_id, NovelStatus.PLANNING, 10, "策划师正在设计故事大纲...")
 
             outline_response = await self.planner.process({"request": request})
-            outline = NovelOutline.parse_raw(outline_response.content)
+            outline: NovelOutline = outline_response.obj
 
             collaboration_log.append(AgentMessage(
                 role=AgentRole.PLANNER,
@@ -754,20 +1218,8 @@ class AgentNovelGenerator:
 
             await self._update_task_status(task_id, NovelStatus.WRITING, 25, "开始创作章节内容...")
 
-            # 阶段2：逐章创作
-            chapters = []
-            for chapter_num in range(1, len(outline.chapter_outlines) + 1):
-                progress = 25 + (chapter_num - 1) * 40 // len(outline.chapter_outlines)
-                await self._update_task_status(
-                    task_id, NovelStatus.WRITING, progress,
-                    f"创作第{chapter_num}章：{outline.chapter_outlines[chapter_num - 1].title}"
-                )
-
-                # 创作章节
-                chapter = await self._create_chapter_with_collaboration(
-                    outline, chapter_num, chapters, collaboration_log
-                )
-                chapters.append(chapter)
+            # 阶段2：按依赖窗口并发创作章节
+            chapters = await self._write_chapters(task_id, outline, collaboration_log)
 
             await self._update_task_status(task_id, NovelStatus.REVIEWING, 80, "进行最终审核...")
 
@@ -775,10 +1227,11 @@ class AgentNovelGenerator:
             final_chapters = await self._final_review_and_polish(chapters, outline, collaboration_log)
 
             # 生成最终结果
+            total_words = sum(ch.word_count for ch in final_chapters)
             generation_stats = {
                 "total_time": (datetime.now() - start_time).total_seconds(),
-                "total_words": sum(ch.word_count for ch in final_chapters),
-                "average_chapter_words": sum(ch.word_count for ch in final_chapters) // len(final_chapters),
+                "total_words": total_words,
+                "average_chapter_words": total_words // len(final_chapters),
                 "collaboration_messages": len(collaboration_log)
             }
 
@@ -806,9 +1259,78 @@ class AgentNovelGenerator:
             await self._update_task_status(task_id, NovelStatus.FAILED, error=str(e))
             raise
 
+    async def _write_chapters(self, task_id: str, outline: NovelOutline,
+                              collaboration_log: List[AgentMessage]) -> List[Chapter]:
+        """并发创作所有章节
+
+        第N章只依赖第1至N-AGENT_CHAPTER_WINDOW章作为前情，窗口内的章节可同时创作。
+        """
+        total = len(outline.chapter_outlines)
+        window = max(1, settings.AGENT_CHAPTER_WINDOW)
+        chapters: List[Optional[Chapter]] = [None] * total
+        finished = [asyncio.Event() for _ in range(total)]
+        summaries: List[Optional[asyncio.Task]] = [None] * total
+        completed = 0
+
+        def progress() -> int:
+            return 25 + completed * 40 // total
+
+        async def summarize(chapter: Chapter):
+            chapter.summary = await self.writer.summarize_chapter(chapter)
+
+        async def write_one(chapter_num: int):
+            nonlocal completed
+            depends_on = max(0, chapter_num - window)
+            for i in range(depends_on):
+                await finished[i].wait()
+            # 前情章节的摘要与窗口内其他章节并行生成，这里等待其完成
+            await asyncio.gather(*summaries[:depends_on])
+
+            await self._update_task_status(
+                task_id, NovelStatus.WRITING,
+                progress(),
+                f"创作第{chapter_num}章：{outline.chapter_outlines[chapter_num - 1].title}"
+            )
+
+            last_update = 0.0
+
+            async def on_progress(received: int):
+                # 流式生成过程中节流上报进度
+                nonlocal last_update
+                now = time.monotonic()
+                if now - last_update >= settings.STREAM_STATUS_INTERVAL:
+                    last_update = now
+                    await self._update_task_status(
+                        task_id, NovelStatus.WRITING,
+                        progress(),
+                        f"创作第{chapter_num}章：已生成{received}字"
+                    )
+
+            chapters[chapter_num - 1] = await self._create_chapter_with_collaboration(
+                outline, chapter_num, chapters[:depends_on], collaboration_log, on_progress
+            )
+            summaries[chapter_num - 1] = asyncio.create_task(summarize(chapters[chapter_num - 1]))
+            completed += 1
+            finished[chapter_num - 1].set()
+
+        tasks = [asyncio.create_task(write_one(n)) for n in range(1, total + 1)]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            # 任一章节失败时取消仍在等待的章节
+            for task in tasks + [t for t in summaries if t]:
+                task.cancel()
+            raise
+
+        # 最后几章的摘要没有后续章节等待，在此补齐
+        await asyncio.gather(*summaries)
+
+        return chapters
+
     async def _create_chapter_with_collaboration(self, outline: NovelOutline, chapter_num: int,
                                                  previous_chapters: List[Chapter],
-                                                 collaboration_log: List[AgentMessage]) -> Chapter:
+                                                 collaboration_log: List[AgentMessage],
+                                                 on_progress: Callable[[int], Awaitable[None]] = None) -> Chapter:
         """协作创作单个章节"""
         max_iterations = settings.AGENT_MAX_ITERATIONS
 
@@ -817,10 +1339,11 @@ class AgentNovelGenerator:
             writer_context = {
                 "outline": outline,
                 "chapter_num": chapter_num,
-                "previous_chapters": previous_chapters
+                "previous_chapters": previous_chapters,
+                "on_progress": on_progress
             }
             writer_response = await self.writer.process(writer_context)
-            chapter = Chapter.parse_raw(writer_response.content)
+            chapter: Chapter = writer_response.obj
 
             collaboration_log.append(AgentMessage(
                 role=AgentRole.WRITER,
@@ -839,7 +1362,7 @@ class AgentNovelGenerator:
                     "previous_chapters": previous_chapters
                 }
                 editor_response = await self.editor.process(editor_context)
-                chapter = Chapter.parse_raw(editor_response.content)
+                chapter = editor_response.obj
 
                 collaboration_log.append(AgentMessage(
                     role=AgentRole.EDITOR,
@@ -851,45 +1374,59 @@ class AgentNovelGenerator:
     async def _final_review_and_polish(self, chapters: List[Chapter], outline: NovelOutline,
                                        collaboration_log: List[AgentMessage]) -> List[Chapter]:
         """最终审核和润色"""
-        polished_chapters = []
+        review_contexts = [{"chapter": chapter, "outline": outline} for chapter in chapters]
+
+        # 批量评审先取回全部结果；否则每章单独评审，并可与编辑调用并行
+        if settings.AGENT_REVIEW_USE_BATCH:
+            review_responses = await self.reviewer.process_batch(review_contexts)
+        else:
+            review_responses = [None] * len(chapters)
 
-        for chapter in chapters:
-            # 最终评审
-            review_context = {
+        async def polish_one(index: int, chapter: Chapter,
+                             review_response: Optional[AgentResponse]) -> Chapter:
+            editor_context = {
                 "chapter": chapter,
-                "outline": outline
+                "outline": outline,
+                "previous_chapters": chapters[:index]
             }
-            review_response = await self.reviewer.process(review_context)
+            edit_task = None
 
-            collaboration_log.append(AgentMessage(
-                role=AgentRole.REVIEWER,
-                content=f"第{chapter.chapter_num}章最终评审完成，质量评分：{review_response.quality_score}"
-            ))
+            try:
+                if review_response is None:
+                    review_task = asyncio.create_task(self.reviewer.process(review_contexts[index]))
+                    if settings.AGENT_SPECULATIVE_EDIT:
+                        # 评审结果出来前先行启动编辑，评审通过时再取消
+                        edit_task = asyncio.create_task(self.editor.process(editor_context))
+                    review_response = await review_task
 
-            # 如果需要进一步优化
-            if review_response.quality_score < 0.8 and review_response.next_action == "revise":
-                editor_context = {
-                    "chapter": chapter,
-                    "outline": outline,
-                    "previous_chapters": polished_chapters
-                }
-                editor_response = await self.editor.process(editor_context)
-                final_chapter = Chapter.parse_raw(editor_response.content)
-                polished_chapters.append(final_chapter)
-            else:
-                polished_chapters.append(chapter)
+                collaboration_log.append(AgentMessage(
+                    role=AgentRole.REVIEWER,
+                    content=f"第{chapter.chapter_num}章最终评审完成，质量评分：{review_response.quality_score}"
+                ))
 
-        return polished_chapters
+                # 如果需要进一步优化
+                if review_response.quality_score < 0.8 and review_response.next_action == "revise":
+                    editor_response = await (edit_task or self.editor.process(editor_context))
+                    return editor_response.obj
+
+                return chapter
+            finally:
+                # 评审通过、评审失败或本协程被取消时，取消预先启动的编辑并等待其结束，
+                # 同时取回它可能抛出的异常，避免"Task exception was never retrieved"
+                if edit_task is not None:
+                    edit_task.cancel()  # 已完成的任务不受影响
+                    with contextlib.suppress(asyncio.CancelledError, Exception):
+                        await edit_task
+
+        return list(await asyncio.gather(
+            *[polish_one(i, chapter, review_response)
+              for i, (chapter, review_response) in enumerate(zip(chapters, review_responses))]
+        ))
 
     async def _update_task_status(self, task_id: str, status: NovelStatus,
                                   progress: int = 0, message: str = None, error: str = None):
         """更新任务状态"""
         try:
-            self.cache.update_task_status(task_id, status.value, progress, error)
-            if message:
-                # 更新当前阶段信息
-                task_data = self.cache.get_task(task_id) or {}
-                task_data["current_stage"] = message
-                self.cache.set_task(task_id, task_data)
+            self.cache.update_task_status_and_message(task_id, status.value, progress, message, error)
         except Exception as e:
             logger.warning(f"状态更新失败: {e}")  # 不中断主流程
\ No newline at end of file
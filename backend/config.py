@@ -1,10 +1,17 @@
 import os
-from typing import Dict, Any
-from pydantic import BaseSettings
+import re
+import sys
+import json
+import functools
+import orjson
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType, SimpleNamespace
+from typing import Dict, Any, Mapping, Tuple, Callable
 
 
-class Settings(BaseSettings):
-    """应用配置"""
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """应用配置（可由环境变量或.env文件覆盖）"""
 
     # 应用基础配置
     APP_NAME: str = "AI小说生成系统"
@@ -13,32 +20,46 @@ class Settings(BaseSettings):
     APP_PORT: int = 8000
     APP_HOST: str = "0.0.0.0"
 
-    # 安全配置
-    SECRET_KEY: str = "your-super-secret-key-change-in-production"
-    CORS_ORIGINS: list = ["http://localhost:3000", "http://127.0.0.1:3000"]
+    # 安全配置（SECRET_KEY见_LAZY_SETTINGS）
+    CORS_ORIGINS: frozenset = frozenset({"http://localhost:3000", "http://127.0.0.1:3000"})
+    PASSWORD_HASH_TIME_COST: int = 2  # argon2id迭代次数（可由系统配置password_hash_cost覆盖）
+    PASSWORD_HASH_MEMORY_COST: int = 65536  # argon2id内存开销（KiB）
 
-    # LLM API配置
-    OPENAI_API_KEY: str = ""
+    # LLM API配置（各API Key见_LAZY_SETTINGS）
     OPENAI_BASE_URL: str = "https://api.openai.com/v1"
     OPENAI_MODEL: str = "gpt-3.5-turbo-16k"
     OPENAI_TEMPERATURE: float = 0.8
     OPENAI_MAX_TOKENS: int = 2000
 
-    # 其他LLM配置
-    ANTHROPIC_API_KEY: str = ""
-    DASHSCOPE_API_KEY: str = ""  # 通义千问
-    MOONSHOT_API_KEY: str = ""  # 月之暗面
+    # LLM连接池配置
+    LLM_MAX_CONNECTIONS: int = 200
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 100
+    LLM_TIMEOUT: float = 60.0
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5  # 连续失败多少次后熔断
+    LLM_BREAKER_RESET_TIMEOUT: float = 30.0  # 熔断冷却时间（秒）
+    # 多模型回退的对冲：最近发起的请求超过"该提供商平均耗时×倍数"仍未返回时，并行请求下一个提供商；
+    # 没有耗时记录时不对冲，只在失败后回退。倍数设为0关闭对冲；LLM_HEDGE_DELAY>0时改用固定延迟（秒）
+    LLM_HEDGE_LATENCY_MULTIPLIER: float = 3.0
+    LLM_HEDGE_DELAY: float = 0.0
 
     # Redis配置
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
-    REDIS_PASSWORD: str = ""
     REDIS_MAX_CONNECTIONS: int = 20
 
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./novels.db"
     DATABASE_ECHO: bool = False
+    DATABASE_POOL_SIZE: int = 10  # 连接池常驻连接数
+    DATABASE_MAX_OVERFLOW: int = 20  # 高峰期允许额外创建的连接数
+    DATABASE_POOL_TIMEOUT: int = 30  # 等待空闲连接的超时（秒）
+    DATABASE_POOL_RECYCLE: int = 1800  # 连接回收时间（秒），避免使用被服务端关闭的空闲连接
+    DATABASE_POOL_PRE_PING: bool = True  # 取出连接前先探活，数据库重启后自动丢弃失效连接
+    DATABASE_QUERY_CACHE_SIZE: int = 1200  # SQL编译缓存条目数（SQLAlchemy默认500）
+    DATABASE_PREPARE_THRESHOLD: int = 5  # psycopg同一语句执行多少次后自动转为服务端预编译
+    DATABASE_CHAPTER_COMPRESSION: str = ""  # 章节正文TOAST压缩算法（PostgreSQL 14+可设为lz4，留空使用默认pglz）
+    DATABASE_DELETE_BATCH_SIZE: int = 10000  # 批量清理时每个事务删除的行数上限
 
     # 业务限制配置
     MAX_TOKENS_PER_REQUEST: int = 50000
@@ -51,14 +72,120 @@ class Settings(BaseSettings):
     AGENT_MAX_ITERATIONS: int = 3
     AGENT_REVIEW_THRESHOLD: float = 0.7
     AGENT_COLLABORATION_ENABLED: bool = True
+    AGENT_CONCURRENCY: int = 4  # 同时进行的LLM调用上限
+    AGENT_CHAPTER_WINDOW: int = 2  # 章节N只等待第N-窗口章及之前的章节完成
+    AGENT_SUMMARY_MAX_TOKENS: int = 200  # 章节摘要调用的最大输出token数
+    AGENT_PREVIOUS_SUMMARY_MAX_CHARS: int = 1500  # 前情提要的总长度预算（字符）
+    STREAM_STATUS_INTERVAL: float = 2.0  # 流式创作时进度上报的最小间隔（秒）
+    # 最终润色时编辑与评审并行，评审通过则取消编辑。被取消的编辑调用同样计费，
+    # 只有多数章节评审不通过时才能节省时间，默认关闭
+    AGENT_SPECULATIVE_EDIT: bool = False
+    AGENT_REVIEW_USE_BATCH: bool = False  # 最终评审使用Batch API（成本减半，但完成时间不确定）
+    AGENT_BATCH_POLL_INTERVAL: int = 30
 
     # 缓存配置
     CACHE_TTL: int = 3600
     RESULT_CACHE_TTL: int = 86400
+    TASK_TTL: int = 604800  # 任务数据（含完整生成结果）在Redis中的保存时间（秒），默认7天；0表示不过期
+    USER_CACHE_TTL: int = 60  # 用户信息快照缓存时间（秒），用户数据变更时主动失效
+    STATS_CACHE_TTL: int = 60  # 系统统计缓存时间（秒），到期自然刷新
+    POPULAR_GENRES_CACHE_TTL: int = 300
+    SYSTEM_CONFIG_LOCAL_TTL: int = 30  # 系统配置进程内缓存时间（秒），本进程修改时立即失效
+    GENERATION_LOG_FLUSH_INTERVAL: float = 0.5  # 生成日志后写队列的最长缓冲时间（秒）
+    GENERATION_LOG_BATCH_SIZE: int = 100  # 生成日志攒够该条数立即批量写入
+    NOVEL_VIEWS_FLUSH_INTERVAL: float = 30.0  # Redis中累计的小说浏览量写回数据库的间隔（秒）
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.3  # 高于该温度的调用不缓存
+    LLM_SEMANTIC_CACHE_ENABLED: bool = False  # 需要安装redisvl
+    LLM_SEMANTIC_CACHE_THRESHOLD: float = 0.1
+    LLM_SEMANTIC_CACHE_MODEL: str = "redis/langcache-embed-v1"
 
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+    # 延迟解析字段的缓存
+    _lazy_values: Dict[str, Any] = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __getattr__(self, name: str) -> Any:
+        """密钥类字段首次访问时才解析，之后使用缓存"""
+        provider = _LAZY_SETTINGS.get(name)
+        if provider is None:
+            raise AttributeError(f"'Settings' object has no attribute '{name}'")
+        cache = object.__getattribute__(self, "_lazy_values")
+        if name not in cache:
+            cache[name] = provider()
+        return cache[name]
+
+
+_ENV_LINE_RE = re.compile(r'^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)\s*=\s*(.*?)\s*$')
+
+
+def _load_env_file(path: str = ".env") -> None:
+    """读取.env文件写入os.environ，已设置的环境变量优先"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return
+
+    for line in lines:
+        if line.lstrip().startswith("#"):
+            continue
+        match = _ENV_LINE_RE.match(line)
+        if not match:
+            continue
+        key, value = match.groups()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+            value = value[1:-1]
+        os.environ.setdefault(key, value)
+
+
+def _cast_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _cast_frozenset(value: str) -> frozenset:
+    """逗号分隔或JSON数组格式的字符串集合"""
+    value = value.strip()
+    items = json.loads(value) if value.startswith("[") else value.split(",")
+    return frozenset(sys.intern(item.strip()) for item in items if item.strip())
+
+
+_CASTS: Dict[type, Callable[[str], Any]] = {
+    bool: _cast_bool,
+    int: int,
+    float: float,
+    str: str,
+    list: json.loads,
+    frozenset: _cast_frozenset,
+}
+
+
+def _parse_env(name: str, default: Any, cast: Callable[[str], Any]) -> Any:
+    return cast(os.environ[name]) if name in os.environ else default
+
+
+def _env_provider(name: str, default: str = "") -> Callable[[], str]:
+    return lambda: os.environ.get(name, default)
+
+
+# 只在用到对应服务时才需要的密钥，首次访问时解析
+_LAZY_SETTINGS: Dict[str, Callable[[], Any]] = {
+    "SECRET_KEY": _env_provider("SECRET_KEY", "your-super-secret-key-change-in-production"),
+    "OPENAI_API_KEY": _env_provider("OPENAI_API_KEY"),
+    "ANTHROPIC_API_KEY": _env_provider("ANTHROPIC_API_KEY"),
+    "DASHSCOPE_API_KEY": _env_provider("DASHSCOPE_API_KEY"),  # 通义千问
+    "MOONSHOT_API_KEY": _env_provider("MOONSHOT_API_KEY"),  # 月之暗面
+    "REDIS_PASSWORD": _env_provider("REDIS_PASSWORD"),
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _load() -> Settings:
+    """加载配置（进程内只解析一次）"""
+    _load_env_file()
+    overrides = {
+        f.name: _parse_env(f.name, None, _CASTS[f.type])
+        for f in fields(Settings)
+        if f.init and f.name in os.environ
+    }
+    return Settings(**overrides)
 
 
 # 小说生成配置
@@ -250,5 +377,124 @@ PROMPT_TEMPLATES = {
     }
 }
 
+
+
+def _freeze(value: Any) -> Any:
+    """递归转换为只读结构：dict -> MappingProxyType，list -> tuple"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _compact_json(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _bullet_list(items) -> str:
+    """拼接为提示词中的列表，每项一行，以 "- " 开头"""
+    return "\n".join("- " + item for item in items)
+
+
+@dataclass(frozen=True, slots=True)
+class GenreConfig:
+    """小说类型配置（只读，提示词片段在导入时预先生成）"""
+    key: str
+    name: str
+    description: str
+    character_prompt: str
+    plot_prompt: str
+    language_prompt: str
+    style_prompts_json: str
+
+
+@dataclass(frozen=True, slots=True)
+class WritingStyleConfig:
+    """写作风格配置（只读）"""
+    key: str
+    name: str
+    characteristics: Tuple[str, ...]
+    language_features: Tuple[str, ...]
+    characteristics_text: str
+    language_features_text: str
+
+
+@dataclass(frozen=True, slots=True)
+class AgentRoleConfig:
+    """Agent角色配置（只读）"""
+    key: str
+    name: str
+    description: str
+    responsibilities: Tuple[str, ...]
+    prompt_style: str
+    system_prompt: str
+    responsibilities_text: str
+
+
+GENRES: Mapping[str, GenreConfig] = MappingProxyType({
+    key: GenreConfig(
+        key=key,
+        name=info["name"],
+        description=info.get("description", ""),
+        character_prompt=info.get("style_prompts", {}).get("character", ""),
+        plot_prompt=info.get("style_prompts", {}).get("plot", ""),
+        language_prompt=info.get("style_prompts", {}).get("language", ""),
+        style_prompts_json=_compact_json(info.get("style_prompts", {}))
+    )
+    for key, info in NOVEL_CONFIG["genres"].items()
+})
+
+WRITING_STYLES: Mapping[str, WritingStyleConfig] = MappingProxyType({
+    key: WritingStyleConfig(
+        key=key,
+        name=info["name"],
+        characteristics=tuple(info.get("characteristics", [])),
+        language_features=tuple(info.get("language_features", [])),
+        characteristics_text=_bullet_list(info.get("characteristics", [])),
+        language_features_text=_bullet_list(info.get("language_features", []))
+    )
+    for key, info in NOVEL_CONFIG["writing_styles"].items()
+})
+
+# 系统提示词不含占位符，导入时直接保存为字符串：SYSTEM_PROMPTS.planner
+SYSTEM_PROMPTS = SimpleNamespace(**PROMPT_TEMPLATES["system_prompts"])
+
+AGENT_ROLE_CONFIGS: Mapping[str, AgentRoleConfig] = MappingProxyType({
+    key: AgentRoleConfig(
+        key=key,
+        name=info["name"],
+        description=info.get("description", ""),
+        responsibilities=tuple(info.get("responsibilities", [])),
+        prompt_style=info.get("prompt_style", ""),
+        system_prompt=getattr(SYSTEM_PROMPTS, key, ""),
+        responsibilities_text=_bullet_list(info.get("responsibilities", []))
+    )
+    for key, info in AGENT_ROLES.items()
+})
+
+
+@functools.lru_cache(maxsize=None)
+def genre_style(genre: str) -> Tuple[str, str]:
+    """类型的 (描述, 风格提示JSON)，未知类型返回空描述和空对象"""
+    config = GENRES.get(genre)
+    return (config.description, config.style_prompts_json) if config else ("", "{}")
+
+
+@functools.lru_cache(maxsize=None)
+def agent_system_prompt(role: str) -> str:
+    """Agent角色的系统提示词，未知角色返回空串"""
+    config = AGENT_ROLE_CONFIGS.get(role)
+    return config.system_prompt if config else ""
+
+
+# 预先序列化的小说配置，/api/config 直接返回，无需每次请求序列化
+NOVEL_CONFIG_JSON: bytes = orjson.dumps(NOVEL_CONFIG, option=orjson.OPT_NON_STR_KEYS)
+
+# 配置在各请求间共享，冻结后防止被意外修改
+NOVEL_CONFIG = _freeze(NOVEL_CONFIG)
+AGENT_ROLES = _freeze(AGENT_ROLES)
+PROMPT_TEMPLATES = _freeze(PROMPT_TEMPLATES)
+
 # 实例化设置
-settings = Settings()
\ No newline at end of file
+settings = _load()
\ No newline at end of file
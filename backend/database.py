@@ -1,28 +1,173 @@
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, JSON, Float, Text, Boolean, ForeignKey
+from sqlalchemy import create_engine, event, text, select, delete, func, DDL, Column, String, Integer, DateTime, JSON, Float, Text, Boolean, ForeignKey, Index
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.dialects.postgresql import UUID
-import uuid
+from sqlalchemy.orm import Session, sessionmaker, scoped_session, relationship, deferred
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.dialects.postgresql import UUID, JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 from datetime import datetime
 import os
-from typing import Optional, List, Dict, Any
+import functools
+from typing import Optional, List, Dict, Any, AsyncIterator
 import json
+import orjson
 from contextlib import contextmanager
 
 from config import settings
 
-# 数据库配置
-DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=20,
-    max_overflow=0,
-    echo=settings.DATABASE_ECHO
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def _normalize_database_url(url: str, driver: str = "psycopg") -> str:
+    """PostgreSQL统一使用指定驱动：同步引擎用psycopg3，异步引擎用asyncpg（均为二进制协议）"""
+    for prefix in ("postgresql://", "postgres://", "postgresql+psycopg2://", "postgresql+psycopg://"):
+        if url.startswith(prefix):
+            return f"postgresql+{driver}://" + url[len(prefix):]
+    return url
+
+
+def _json_serializer(value: Any) -> str:
+    """JSON列序列化（orjson）"""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+@functools.lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    """数据库引擎（首次使用时创建，导入本模块不会连接数据库或加载驱动）"""
+    url = _normalize_database_url(settings.DATABASE_URL)
+    # psycopg在同一语句执行若干次后自动使用服务端预编译语句，复用执行计划
+    connect_args = (
+        {"prepare_threshold": settings.DATABASE_PREPARE_THRESHOLD}
+        if url.startswith("postgresql+psycopg://") else {}
+    )
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
+        future=True,
+        # 批量INSERT ... RETURNING 按1000行一批拆分语句
+        insertmanyvalues_page_size=1000,
+        json_serializer=_json_serializer,
+        json_deserializer=orjson.loads,
+        echo=settings.DATABASE_ECHO
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_sessionmaker() -> sessionmaker:
+    """会话工厂（绑定到get_engine()）
+
+    提交后不使对象过期：提交后再读取属性或返回模型时不会重新查询数据库。
+    """
+    return sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=get_engine())
+
+
+def get_session() -> Session:
+    """创建新的数据库会话"""
+    return get_sessionmaker()()
+
+
+@functools.lru_cache(maxsize=1)
+def get_scoped_session() -> scoped_session:
+    """线程内共享的会话注册表：同一线程取到同一个会话，不同线程互不影响
+
+    请求或任务结束时调用 get_scoped_session().remove() 关闭并释放当前线程的会话。
+    """
+    return scoped_session(get_sessionmaker())
+
+
+def _dispose_engine_after_fork() -> None:
+    # 子进程不能复用父进程连接池里的连接；close=False 只丢弃引用，不关闭父进程仍在使用的连接
+    if get_engine.cache_info().currsize:
+        get_engine().dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_engine_after_fork)
+
+
+@functools.lru_cache(maxsize=1)
+def get_async_engine() -> AsyncEngine:
+    """异步数据库引擎（asyncpg），供FastAPI请求处理使用，数据库I/O不阻塞事件循环
+
+    同步引擎保留给后台任务等允许阻塞的场景。
+    """
+    return create_async_engine(
+        _normalize_database_url(settings.DATABASE_URL, driver="asyncpg"),
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        query_cache_size=settings.DATABASE_QUERY_CACHE_SIZE,
+        json_serializer=_json_serializer,
+        json_deserializer=orjson.loads,
+        echo=settings.DATABASE_ECHO
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_async_sessionmaker() -> async_sessionmaker:
+    """异步会话工厂（绑定到get_async_engine()）"""
+    return async_sessionmaker(get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
 Base = declarative_base()
 
+# 所有JSON列：PostgreSQL上使用二进制存储的JSONB（读取无需重新解析，可建GIN索引），其他数据库退回JSON
+JSONBType = JSON().with_variant(JSONB(), "postgresql")
+
+
+class utcnow(FunctionElement):
+    """数据库端生成的UTC时间戳，写入时不再逐行调用datetime.utcnow()"""
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite的CURRENT_TIMESTAMP本身即为UTC
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+class gen_random_uuid(FunctionElement):
+    """数据库端生成的UUID主键，插入时不再逐行调用uuid.uuid4()"""
+    type = UUID(as_uuid=True)
+    inherit_cache = True
+
+
+@compiles(gen_random_uuid)
+def _gen_random_uuid_default(element, compiler, **kw):
+    # SQLite没有UUID函数，用16字节随机数的十六进制表示（与UUID列的存储格式一致）
+    return "(lower(hex(randomblob(16))))"
+
+
+@compiles(gen_random_uuid, "postgresql")
+def _gen_random_uuid_postgresql(element, compiler, **kw):
+    return "gen_random_uuid()"
+
+
+# PostgreSQL 13以下gen_random_uuid()由pgcrypto扩展提供
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pgcrypto").execute_if(dialect="postgresql")
+)
+# 标题模糊搜索（LIKE '%关键词%'）使用的三元组索引由pg_trgm扩展提供
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
 
 # ==================== 数据模型 ====================
 
@@ -30,7 +175,7 @@ class User(Base):
     """用户模型"""
     __tablename__ = "users"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
     email = Column(String(255), unique=True, nullable=False, index=True)
     username = Column(String(100), unique=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
@@ -43,13 +188,13 @@ class User(Base):
     is_verified = Column(Boolean, default=False)
 
     # 时间戳
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
     last_login = Column(DateTime)
     last_active = Column(DateTime)
 
     # 用户设置和偏好
-    preferences = Column(JSON, default=lambda: {
+    preferences = Column(JSONBType, default=lambda: {
         "preferred_genre": None,
         "preferred_style": "知乎风格",
         "default_word_count": 30000,
@@ -69,11 +214,14 @@ class User(Base):
     total_words_generated = Column(Integer, default=0)
     average_quality_score = Column(Float, default=0.0)
 
-    # 关系
-    novels = relationship("Novel", back_populates="user", cascade="all, delete-orphan")
-    templates = relationship("UserTemplate", back_populates="user")
-    api_keys = relationship("UserAPIKey", back_populates="user")
-    generation_logs = relationship("GenerationLog", back_populates="user")
+    # 关系统一使用 raise_on_sql：需要时在查询中显式 selectinload，遗漏预加载会直接报错而不是悄悄产生N+1查询；
+    # 删除时的级联仍由ORM完成（工作单元加载子集合不受 raise_on_sql 限制）：SQLite默认不启用外键约束，
+    # 早先创建的PostgreSQL表上外键也没有 ON DELETE 规则，不能只依赖数据库级联
+    novels = relationship("Novel", back_populates="user", cascade="all, delete-orphan",
+                          lazy="raise_on_sql")
+    templates = relationship("UserTemplate", back_populates="user", lazy="raise_on_sql")
+    api_keys = relationship("UserAPIKey", back_populates="user", lazy="raise_on_sql")
+    generation_logs = relationship("GenerationLog", back_populates="user", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"<User(id={self.id}, username={self.username}, email={self.email})>"
@@ -82,9 +230,20 @@ class User(Base):
 class Novel(Base):
     """小说模型"""
     __tablename__ = "novels"
-
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    __table_args__ = (
+        # 大纲内容检索
+        Index("ix_novels_outline_gin", "outline", postgresql_using="gin").ddl_if(dialect="postgresql"),
+        # 元数据包含查询，如 metadata @> '{"language": "zh-CN"}'
+        Index("ix_novels_metadata_gin", "metadata", postgresql_using="gin").ddl_if(dialect="postgresql"),
+        # 标题/副标题的子串搜索；中文不分词，用三元组索引而非全文检索
+        Index("ix_novels_title_trgm", "title", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_novels_subtitle_trgm", "subtitle", postgresql_using="gin",
+              postgresql_ops={"subtitle": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
     # 基本信息
     title = Column(String(200), nullable=False)
@@ -93,9 +252,11 @@ class Novel(Base):
     status = Column(String(50), default="draft")  # draft, generating, completed, failed, published
 
     # 内容
-    outline = Column(JSON)  # 大纲JSON
-    chapters = Column(JSON)  # 章节内容JSON
-    metadata = Column(JSON, default=lambda: {
+    # 大纲体积大，列表查询不加载，访问属性或 undefer(Novel.outline) 时才读取
+    outline = deferred(Column(JSONBType))  # 大纲JSON
+    # 章节内容只存放在chapters表中（见chapters_list），不再在小说行上冗余一份JSON
+    # 属性名不能用metadata（与声明式基类的Base.metadata冲突），列名保持不变
+    meta = Column("metadata", JSONBType, default=lambda: {
         "total_words": 0,
         "total_chapters": 0,
         "agent_collaboration": False,
@@ -105,14 +266,14 @@ class Novel(Base):
     })
 
     # 生成参数
-    generation_params = Column(JSON)  # 保存生成时的参数
+    generation_params = Column(JSONBType)  # 保存生成时的参数
     model_used = Column(String(100))
     total_tokens = Column(Integer, default=0)
     generation_cost = Column(Float, default=0.0)
     generation_time = Column(Float, default=0.0)  # 生成耗时（秒）
 
     # 质量指标
-    quality_scores = Column(JSON, default=lambda: {
+    quality_scores = Column(JSONBType, default=lambda: {
         "overall_score": 0.0,
         "content_quality": 0.0,
         "readability": 0.0,
@@ -121,12 +282,12 @@ class Novel(Base):
     })
 
     # Agent协作信息
-    agent_collaboration_log = Column(JSON, default=list)
+    agent_collaboration_log = Column(JSONBType, default=list)
     iteration_count = Column(Integer, default=1)
     collaboration_enabled = Column(Boolean, default=True)
 
     # 读者统计
-    reader_stats = Column(JSON, default=lambda: {
+    reader_stats = Column(JSONBType, default=lambda: {
         "view_count": 0,
         "like_count": 0,
         "share_count": 0,
@@ -136,23 +297,24 @@ class Novel(Base):
     })
 
     # 时间戳
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
     published_at = Column(DateTime)
     completed_at = Column(DateTime)
 
     # 发布信息
     is_public = Column(Boolean, default=False)
     is_featured = Column(Boolean, default=False)
-    external_urls = Column(JSON, default=lambda: {
+    external_urls = Column(JSONBType, default=lambda: {
         "zhihu_url": None,
         "other_platforms": []
     })
 
     # 关系
-    user = relationship("User", back_populates="novels")
-    chapters_list = relationship("Chapter", back_populates="novel", cascade="all, delete-orphan")
-    generation_logs = relationship("GenerationLog", back_populates="novel")
+    user = relationship("User", back_populates="novels", lazy="raise_on_sql")
+    chapters_list = relationship("Chapter", back_populates="novel", cascade="all, delete-orphan",
+                                 order_by="Chapter.chapter_number", lazy="raise_on_sql")
+    generation_logs = relationship("GenerationLog", back_populates="novel", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"<Novel(id={self.id}, title={self.title}, status={self.status})>"
@@ -162,27 +324,26 @@ class Chapter(Base):
     """章节模型"""
     __tablename__ = "chapters"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    novel_id = Column(UUID(as_uuid=True), ForeignKey("novels.id"), nullable=False)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
+    novel_id = Column(UUID(as_uuid=True), ForeignKey("novels.id", ondelete="CASCADE"), nullable=False)
 
     chapter_number = Column(Integer, nullable=False)
     title = Column(String(200))
-    content = Column(Text)
+    content = deferred(Column(Text))  # 正文按需加载，需要时用 undefer(Chapter.content)
     word_count = Column(Integer)
 
     # 生成信息
-    outline = Column(JSON)  # 章节大纲
+    outline = Column(JSONBType)  # 章节大纲
     generation_attempts = Column(Integer, default=1)
     tokens_used = Column(Integer)
     generation_time = Column(Float)  # 生成耗时
 
     # 版本控制
-    version = Column(Integer, default=1)
-    previous_versions = Column(JSON, default=list)
+    version = Column(Integer, default=1)  # 历史版本见chapter_versions表
 
     # 质量评估
     quality_score = Column(Float)
-    quality_details = Column(JSON, default=lambda: {
+    quality_details = Column(JSONBType, default=lambda: {
         "completeness": 0.0,
         "plot_progression": 0.0,
         "character_development": 0.0,
@@ -191,7 +352,7 @@ class Chapter(Base):
     })
 
     # Agent处理记录
-    agent_notes = Column(JSON, default=lambda: {
+    agent_notes = Column(JSONBType, default=lambda: {
         "writer_notes": None,
         "editor_notes": None,
         "reviewer_notes": None
@@ -201,33 +362,70 @@ class Chapter(Base):
     user_rating = Column(Float)
     user_notes = Column(Text)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     # 关系
-    novel = relationship("Novel", back_populates="chapters_list")
+    novel = relationship("Novel", back_populates="chapters_list", lazy="raise_on_sql")
+    versions = relationship("ChapterVersion", back_populates="chapter", cascade="all, delete-orphan",
+                            order_by="ChapterVersion.version", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"<Chapter(id={self.id}, novel_id={self.novel_id}, number={self.chapter_number})>"
 
 
+class ChapterVersion(Base):
+    """章节历史版本模型（每次修改正文插入一行，不再重写整个版本列表）"""
+    __tablename__ = "chapter_versions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
+    chapter_id = Column(UUID(as_uuid=True), ForeignKey("chapters.id", ondelete="CASCADE"), nullable=False)
+
+    version = Column(Integer, nullable=False)
+    content = deferred(Column(Text))
+    word_count = Column(Integer)
+
+    # 该版本原本的最后修改时间
+    created_at = Column(DateTime, server_default=utcnow())
+
+    # 关系
+    chapter = relationship("Chapter", back_populates="versions", lazy="raise_on_sql")
+
+    def __repr__(self):
+        return f"<ChapterVersion(chapter_id={self.chapter_id}, version={self.version})>"
+
+
+# 章节正文体积大，明确使用EXTENDED存储（压缩后行外存放），小说列表等查询不会读取正文
+event.listen(
+    Chapter.__table__, "after_create",
+    DDL("ALTER TABLE chapters ALTER COLUMN content SET STORAGE EXTENDED").execute_if(dialect="postgresql")
+)
+if settings.DATABASE_CHAPTER_COMPRESSION in ("pglz", "lz4"):
+    event.listen(
+        Chapter.__table__, "after_create",
+        DDL(
+            f"ALTER TABLE chapters ALTER COLUMN content SET COMPRESSION {settings.DATABASE_CHAPTER_COMPRESSION}"
+        ).execute_if(dialect="postgresql")
+    )
+
+
 class GenerationLog(Base):
     """生成日志模型"""
     __tablename__ = "generation_logs"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    novel_id = Column(UUID(as_uuid=True), ForeignKey("novels.id"))
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
+    novel_id = Column(UUID(as_uuid=True), ForeignKey("novels.id", ondelete="SET NULL"))
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
 
     # 生成阶段和状态
     stage = Column(String(50))  # outline, chapter_outline, content, polish, review
     agent_role = Column(String(50))  # planner, writer, editor, reviewer
     status = Column(String(50))  # success, failed, timeout, retry
 
-    # 请求和响应
-    request_prompt = Column(Text)
-    response_content = Column(Text)
-    request_parameters = Column(JSON)
+    # 请求和响应（体积大且统计/列表查询用不到，访问时才加载）
+    request_prompt = deferred(Column(Text), group="payload")
+    response_content = deferred(Column(Text), group="payload")
+    request_parameters = deferred(Column(JSONBType), group="payload")
 
     # 性能指标
     tokens_used = Column(Integer)
@@ -237,7 +435,7 @@ class GenerationLog(Base):
 
     # 质量指标
     quality_score = Column(Float)
-    quality_metrics = Column(JSON)
+    quality_metrics = deferred(Column(JSONBType), group="payload")
 
     # 错误信息
     error_message = Column(Text)
@@ -245,14 +443,14 @@ class GenerationLog(Base):
     retry_count = Column(Integer, default=0)
 
     # 上下文信息
-    context_data = Column(JSON)  # 保存生成时的上下文
+    context_data = deferred(Column(JSONBType), group="payload")  # 保存生成时的上下文
     iteration_number = Column(Integer, default=1)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
 
     # 关系
-    novel = relationship("Novel", back_populates="generation_logs")
-    user = relationship("User", back_populates="generation_logs")
+    novel = relationship("Novel", back_populates="generation_logs", lazy="raise_on_sql")
+    user = relationship("User", back_populates="generation_logs", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"<GenerationLog(id={self.id}, stage={self.stage}, status={self.status})>"
@@ -262,15 +460,15 @@ class UserTemplate(Base):
     """用户模板模型"""
     __tablename__ = "user_templates"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
 
     name = Column(String(200), nullable=False)
     description = Column(Text)
     template_type = Column(String(50))  # outline, character, world, style
     category = Column(String(50))  # 模板分类
 
-    content = Column(JSON)
+    content = Column(JSONBType)
     example_usage = Column(Text)
 
     # 使用统计
@@ -283,14 +481,14 @@ class UserTemplate(Base):
     is_featured = Column(Boolean, default=False)
 
     # 标签和搜索
-    tags = Column(JSON, default=list)
-    keywords = Column(JSON, default=list)
+    tags = Column(JSONBType, default=list)
+    keywords = Column(JSONBType, default=list)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     # 关系
-    user = relationship("User", back_populates="templates")
+    user = relationship("User", back_populates="templates", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"<UserTemplate(id={self.id}, name={self.name}, type={self.template_type})>"
@@ -300,8 +498,8 @@ class UserAPIKey(Base):
     """用户API密钥模型（支持自带密钥）"""
     __tablename__ = "user_api_keys"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="SET NULL"))
 
     provider = Column(String(50))  # openai, anthropic, qwen, moonshot, etc.
     api_key_encrypted = Column(String(500))  # 加密存储
@@ -310,7 +508,7 @@ class UserAPIKey(Base):
 
     # 配置信息
     base_url = Column(String(500))  # 自定义API端点
-    model_preferences = Column(JSON, default=lambda: {
+    model_preferences = Column(JSONBType, default=lambda: {
         "preferred_model": None,
         "max_tokens": 2000,
         "temperature": 0.8
@@ -327,11 +525,11 @@ class UserAPIKey(Base):
     daily_limit = Column(Integer, default=100000)  # 每日Token限制
     monthly_budget = Column(Float, default=0.0)  # 月度预算限制
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     # 关系
-    user = relationship("User", back_populates="api_keys")
+    user = relationship("User", back_populates="api_keys", lazy="raise_on_sql")
 
     def __repr__(self):
         return f"<UserAPIKey(id={self.id}, provider={self.provider}, active={self.is_active})>"
@@ -341,15 +539,15 @@ class SystemConfig(Base):
     """系统配置模型"""
     __tablename__ = "system_configs"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
     key = Column(String(100), unique=True, nullable=False)
-    value = Column(JSON)
+    value = Column(JSONBType)
     description = Column(Text)
     category = Column(String(50))  # system, user, generation, etc.
     is_public = Column(Boolean, default=False)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     def __repr__(self):
         return f"<SystemConfig(key={self.key}, category={self.category})>"
@@ -359,7 +557,7 @@ class TaskQueue(Base):
     """任务队列模型"""
     __tablename__ = "task_queue"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(UUID(as_uuid=True), primary_key=True, server_default=gen_random_uuid())
     task_id = Column(String(100), unique=True, nullable=False)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
 
@@ -368,8 +566,8 @@ class TaskQueue(Base):
     status = Column(String(50), default="pending")  # pending, processing, completed, failed
 
     # 任务数据
-    task_data = Column(JSON)
-    result_data = Column(JSON)
+    task_data = Column(JSONBType)
+    result_data = Column(JSONBType)
     error_message = Column(Text)
 
     # 处理信息
@@ -379,21 +577,65 @@ class TaskQueue(Base):
     retry_count = Column(Integer, default=0)
     max_retries = Column(Integer, default=3)
 
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     def __repr__(self):
         return f"<TaskQueue(task_id={self.task_id}, status={self.status})>"
 
 
+# ==================== 索引 ====================
+
+# 按小说+阶段查看生成日志，按时间倒序
+Index("ix_gen_logs_novel_stage", GenerationLog.novel_id, GenerationLog.stage, GenerationLog.created_at.desc())
+# 用户维度的日志统计；PostgreSQL上附带统计用到的列，聚合查询可走仅索引扫描
+Index(
+    "ix_gen_logs_user_created", GenerationLog.user_id, GenerationLog.created_at.desc(),
+    postgresql_include=["stage", "status", "tokens_used", "cost"]
+)
+# 按时间清理旧日志（不带用户条件）
+Index("ix_gen_logs_created", GenerationLog.created_at)
+# 清理失败任务、按状态取待处理任务
+Index("ix_task_queue_status_created", TaskQueue.status, TaskQueue.created_at)
+# 取待处理任务：部分索引只包含pending行，按优先级、创建时间顺序读取免去排序
+Index(
+    "ix_task_queue_pending", TaskQueue.priority.desc(), TaskQueue.created_at,
+    postgresql_where=TaskQueue.status == "pending",
+    sqlite_where=TaskQueue.status == "pending"
+)
+# 查询用户可用的API密钥
+Index(
+    "ix_api_keys_user_provider_active", UserAPIKey.user_id, UserAPIKey.provider,
+    postgresql_where=UserAPIKey.is_active == True,
+    sqlite_where=UserAPIKey.is_active == True
+)
+# 章节按编号读取，同一小说的章节编号唯一
+Index("ix_chapters_novel_num", Chapter.novel_id, Chapter.chapter_number, unique=True)
+# 章节历史按版本号读取
+Index("ix_chapter_versions_chapter_version", ChapterVersion.chapter_id, ChapterVersion.version, unique=True)
+# 用户作品列表：按状态筛选，默认按创建时间倒序
+Index("ix_novels_user_status", Novel.user_id, Novel.status, Novel.created_at.desc())
+# 不带状态筛选的用户作品列表，按创建时间倒序，免去排序
+Index("ix_novels_user_created", Novel.user_id, Novel.created_at.desc(), postgresql_include=["status"])
+# 元数据中的总字数（统计求和、按字数筛选）
+Index("ix_novels_total_words", Novel.meta["total_words"].as_integer()).ddl_if(dialect="postgresql")
+
+
 # ==================== 数据库操作类 ====================
 
+def dialect_insert(dialect_name: str):
+    """返回支持 ON CONFLICT 的方言 insert 构造函数"""
+    if dialect_name == "postgresql":
+        return pg_insert
+    return sqlite_insert
+
+
 class DatabaseManager:
     """数据库管理器"""
 
     def __init__(self):
-        self.engine = engine
-        self.SessionLocal = SessionLocal
+        self.engine = get_engine()
+        self.SessionLocal = get_sessionmaker()
 
     @contextmanager
     def get_session(self):
@@ -419,18 +661,14 @@ class DatabaseManager:
     def init_system_data(self):
         """初始化系统数据"""
         with self.get_session() as session:
-            # 检查是否已初始化
-            existing_config = session.query(SystemConfig).filter_by(key="system_initialized").first()
-            if existing_config:
-                return
-
             # 创建默认系统配置
             default_configs = [
                 {
                     "key": "system_initialized",
                     "value": {"initialized": True, "version": "1.0.0"},
                     "description": "系统初始化标记",
-                    "category": "system"
+                    "category": "system",
+                    "is_public": False
                 },
                 {
                     "key": "default_generation_params",
@@ -441,7 +679,8 @@ class DatabaseManager:
                         "quality_threshold": 0.7
                     },
                     "description": "默认生成参数",
-                    "category": "generation"
+                    "category": "generation",
+                    "is_public": False
                 },
                 {
                     "key": "subscription_tiers",
@@ -457,10 +696,11 @@ class DatabaseManager:
                 }
             ]
 
-            for config_data in default_configs:
-                config = SystemConfig(**config_data)
-                session.add(config)
-
+            # 已存在的配置保持不变；多个进程同时启动也不会触发唯一约束冲突
+            insert_stmt = dialect_insert(session.get_bind().dialect.name)
+            session.execute(
+                insert_stmt(SystemConfig).values(default_configs).on_conflict_do_nothing(index_elements=["key"])
+            )
             session.commit()
 
 
@@ -468,19 +708,25 @@ class DatabaseManager:
 
 def get_db():
     """获取数据库会话（依赖注入用）"""
-    db = SessionLocal()
+    db = get_session()
     try:
         yield db
     finally:
         db.close()
 
 
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """获取异步数据库会话（async def 路由的依赖注入用）"""
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
 def init_database():
     """初始化数据库"""
     print("🏗️ 创建数据库表...")
 
     # 创建所有表
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
 
     # 初始化系统数据
     db_manager = DatabaseManager()
@@ -489,11 +735,23 @@ def init_database():
     print("✅ 数据库初始化完成")
 
 
-def check_database_connection():
-    """检查数据库连接"""
+_connection_verified = False
+
+
+def check_database_connection(force: bool = False):
+    """检查数据库连接
+
+    首次成功后直接返回True（日常的连接有效性由连接池pre-ping保证），
+    避免存活探针每次都占用连接执行查询；force=True时强制重新检查。
+    """
+    global _connection_verified
+    if _connection_verified and not force:
+        return True
+
     try:
-        with engine.connect() as conn:
-            conn.execute("SELECT 1")
+        with get_engine().connect() as conn:
+            conn.execute(text("SELECT 1"))
+        _connection_verified = True
         return True
     except Exception as e:
         print(f"❌ 数据库连接失败: {e}")
@@ -504,7 +762,7 @@ def check_database_connection():
 
 def create_sample_user():
     """创建示例用户"""
-    with SessionLocal() as session:
+    with get_session() as session:
         # 检查是否已存在示例用户
         existing_user = session.query(User).filter_by(email="demo@example.com").first()
         if existing_user:
@@ -512,13 +770,12 @@ def create_sample_user():
             return existing_user
 
         # 创建示例用户
-        import bcrypt
-        password_hash = bcrypt.hashpw("demo123".encode('utf-8'), bcrypt.gensalt())
+        from passwords import hash_password
 
         user = User(
             email="demo@example.com",
             username="demo_user",
-            password_hash=password_hash.decode('utf-8'),
+            password_hash=hash_password("demo123"),
             is_verified=True,
             subscription_tier="pro"
         )
@@ -531,67 +788,61 @@ def create_sample_user():
         return user
 
 
+def delete_in_batches(session: Session, model, *criteria, batch_size: Optional[int] = None) -> int:
+    """按条件分批删除，每批单独提交，避免一次删除大量行长时间持有锁；返回删除总行数"""
+    batch_size = batch_size or settings.DATABASE_DELETE_BATCH_SIZE
+    batch_ids = select(model.id).where(*criteria).limit(batch_size).scalar_subquery()
+    stmt = delete(model).where(model.id.in_(batch_ids)).execution_options(synchronize_session=False)
+
+    deleted = 0
+    while True:
+        count = session.execute(stmt).rowcount
+        session.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
 def cleanup_old_data(days: int = 30):
     """清理旧数据"""
     from datetime import timedelta
 
     cutoff_date = datetime.utcnow() - timedelta(days=days)
 
-    with SessionLocal() as session:
+    with get_session() as session:
         # 清理旧的生成日志
-        old_logs = session.query(GenerationLog).filter(
-            GenerationLog.created_at < cutoff_date
-        ).count()
-
-        session.query(GenerationLog).filter(
-            GenerationLog.created_at < cutoff_date
-        ).delete()
+        old_logs = delete_in_batches(session, GenerationLog, GenerationLog.created_at < cutoff_date)
 
         # 清理失败的任务
-        failed_tasks = session.query(TaskQueue).filter(
+        failed_tasks = delete_in_batches(
+            session, TaskQueue,
             TaskQueue.status == "failed",
             TaskQueue.created_at < cutoff_date
-        ).count()
-
-        session.query(TaskQueue).filter(
-            TaskQueue.status == "failed",
-            TaskQueue.created_at < cutoff_date
-        ).delete()
-
-        session.commit()
+        )
 
         print(f"🧹 清理完成：删除了{old_logs}条日志，{failed_tasks}个失败任务")
 
 
 def get_database_stats():
     """获取数据库统计信息"""
-    with SessionLocal() as session:
-        stats = {
-            "users": session.query(User).count(),
-            "novels": session.query(Novel).count(),
-            "chapters": session.query(Chapter).count(),
-            "generation_logs": session.query(GenerationLog).count(),
-            "templates": session.query(UserTemplate).count(),
-            "pending_tasks": session.query(TaskQueue).filter_by(status="pending").count()
-        }
-
-        # 统计完成的小说
-        completed_novels = session.query(Novel).filter_by(status="completed").count()
-        stats["completed_novels"] = completed_novels
-
-        # 统计总字数
-        total_words = session.query(Novel).with_entities(
-            Novel.metadata
-        ).all()
-
-        word_count = 0
-        for novel in total_words:
-            if novel.metadata and "total_words" in novel.metadata:
-                word_count += novel.metadata["total_words"]
-
-        stats["total_words"] = word_count
-
-        return stats
+    def count(model, *criteria):
+        return select(func.count()).select_from(model).where(*criteria).scalar_subquery()
+
+    # 所有计数与总字数合并为一条查询，总字数在数据库端从元数据中求和
+    stmt = select(
+        count(User).label("users"),
+        count(Novel).label("novels"),
+        count(Chapter).label("chapters"),
+        count(GenerationLog).label("generation_logs"),
+        count(UserTemplate).label("templates"),
+        count(TaskQueue, TaskQueue.status == "pending").label("pending_tasks"),
+        count(Novel, Novel.status == "completed").label("completed_novels"),
+        select(func.coalesce(func.sum(Novel.meta["total_words"].as_integer()), 0))
+        .scalar_subquery().label("total_words"),
+    )
+
+    with get_session() as session:
+        return dict(session.execute(stmt).one()._mapping)
 
 
 # ==================== 主函数 ====================
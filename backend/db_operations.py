@@ -1,29 +1,122 @@
 from typing import List, Optional, Dict, Any, Tuple
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, asc, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Session, selectinload, undefer, raiseload, load_only
+from sqlalchemy import (
+    and_, or_, desc, asc, func, insert, update, delete, select, true, bindparam, literal_column
+)
 from datetime import datetime, timedelta
-import bcrypt
 import json
-import uuid
+import logging
+import queue
+import threading
+import time
+import orjson
 
 from database import (
-    User, Novel, Chapter, GenerationLog, UserTemplate,
-    UserAPIKey, SystemConfig, TaskQueue
+    User, Novel, Chapter, ChapterVersion, GenerationLog, UserTemplate,
+    UserAPIKey, SystemConfig, TaskQueue, delete_in_batches, get_scoped_session,
+    get_session, dialect_insert
 )
 from models import NovelRequest, NovelResult
+from text_utils import count_words
+from config import settings
+from passwords import (
+    hash_password, hash_password_async, check_password, check_password_async,
+    configure_password_hasher, calibrate_time_cost
+)
+
+logger = logging.getLogger(__name__)
+
+# 系统配置进程内缓存：{缓存键: (过期时刻, 值)}；配置极少修改且每个请求都会读取，
+# 短时间内直接使用本进程内存中的结果，不访问数据库或Redis。其他进程的修改最迟TTL秒后可见
+_local_config_cache: Dict[str, Tuple[float, Any]] = {}
+
+
+def _local_cached(key: str, compute):
+    """读取进程内缓存，未命中或过期时计算并保存（结果为None也缓存）"""
+    entry = _local_config_cache.get(key)
+    now = time.monotonic()
+    if entry is not None and entry[0] > now:
+        return entry[1]
+    value = compute()
+    _local_config_cache[key] = (now + settings.SYSTEM_CONFIG_LOCAL_TTL, value)
+    return value
+
+
+def _invalidate_local_config(key: str) -> None:
+    """本进程修改配置后，丢弃该配置及所有公开配置列表的缓存"""
+    _local_config_cache.pop(f"config:{key}", None)
+    for cache_key in [k for k in _local_config_cache if k.startswith("public_configs:")]:
+        _local_config_cache.pop(cache_key, None)
 
 
 class DatabaseOperations:
     """数据库操作封装类"""
 
-    def __init__(self, db: Session):
-        self.db = db
+    # 系统配置中的密码哈希参数只在进程内读取一次
+    _password_cost_loaded = False
+
+    # 鉴权等热点路径上的用户查询：语句只构造一次，参数在执行时绑定，
+    # 每次调用直接命中SQLAlchemy的编译缓存，省去重复构建查询对象
+    _user_by_email_stmt = select(User).where(User.email == bindparam("email"))
+    _user_by_username_stmt = select(User).where(User.username == bindparam("username"))
+    _user_by_id_stmt = select(User).where(User.id == bindparam("user_id"))
+
+    def __init__(self, db: Session = None, cache=None):
+        # 未显式传入会话时使用当前线程的会话（见 get_scoped_session），不在线程间共享
+        self.db = db if db is not None else get_scoped_session()()
+        # 可选的RedisCache，用于缓存鉴权等热点路径上的用户查询
+        self.cache = cache
+
+    @staticmethod
+    def _column_values(model, values: Dict[str, Any]) -> Dict[str, Any]:
+        """只保留映射列对应的字段
+
+        不能用hasattr判断：metadata、registry等声明式基类属性也会通过。
+        旧调用方传入的metadata按Novel.meta列处理。
+        """
+        columns = model.__mapper__.column_attrs
+        result = {}
+        for key, value in values.items():
+            if key == "metadata" and "meta" in columns:
+                key = "meta"
+            if key in columns:
+                result[key] = value
+        return result
+
+    def _json_merge(self, column, patch: Dict[str, Any]):
+        """JSON列浅合并表达式：在数据库端把patch的键覆盖到原值上，避免读出整份文档再写回"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            return func.coalesce(column, literal_column("'{}'::jsonb")).op("||")(
+                bindparam(None, patch, type_=JSONB)
+            )
+        return func.json_patch(func.coalesce(column, "{}"), orjson.dumps(patch).decode())
+
+    def _insert_returning(self, model, rows: List[Dict[str, Any]]) -> List[Any]:
+        """INSERT ... RETURNING 写入并直接取回完整对象，无需逐行 refresh 再查一次"""
+        objects = self.db.scalars(insert(model).returning(model), rows).all()
+        self.db.commit()
+        return list(objects)
 
     # ==================== 用户操作 ====================
 
     def create_user(self, email: str, username: str, password: str, **kwargs) -> User:
         """创建用户"""
-        # 检查用户是否已存在
+        self._check_new_user(email, username)
+
+        # 密码加密
+        self._ensure_password_cost()
+        return self._insert_user(email, username, hash_password(password), **kwargs)
+
+    async def create_user_async(self, email: str, username: str, password: str, **kwargs) -> User:
+        """创建用户（密码哈希在线程池中计算，数据库操作仍在当前会话中执行）"""
+        self._check_new_user(email, username)
+
+        self._ensure_password_cost()
+        return self._insert_user(email, username, await hash_password_async(password), **kwargs)
+
+    def _check_new_user(self, email: str, username: str) -> None:
+        """检查邮箱和用户名是否已被使用"""
         existing_user = self.get_user_by_email(email)
         if existing_user:
             raise ValueError(f"邮箱 {email} 已被使用")
@@ -32,39 +125,95 @@ class DatabaseOperations:
         if existing_username:
             raise ValueError(f"用户名 {username} 已被使用")
 
-        # 密码加密
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-
-        user = User(
+    def _insert_user(self, email: str, username: str, password_hash: str, **kwargs) -> User:
+        [user] = self._insert_returning(User, [dict(
             email=email,
             username=username,
-            password_hash=password_hash.decode('utf-8'),
+            password_hash=password_hash,
             **kwargs
-        )
-
-        self.db.add(user)
-        self.db.commit()
-        self.db.refresh(user)
+        )])
         return user
 
     def get_user_by_email(self, email: str) -> Optional[User]:
         """通过邮箱获取用户"""
-        return self.db.query(User).filter(User.email == email).first()
+        return self.db.execute(self._user_by_email_stmt, {"email": email}).scalar_one_or_none()
+
+    def get_cached_user(self, email: str = None, user_id: str = None) -> Optional[Dict]:
+        """获取用户信息快照（优先读缓存），供鉴权等只读场景使用
+
+        返回列值字典而非ORM对象（不含密码哈希，时间等字段为字符串）；
+        需要修改用户时仍应使用 get_user_by_email / get_user_by_id。
+        """
+        key = f"user:email:{email}" if email else f"user:id:{user_id}"
+        if self.cache:
+            snapshot = self.cache.get(key)
+            if snapshot is not None:
+                return snapshot
+
+        user = self.get_user_by_email(email) if email else self.get_user_by_id(user_id)
+        if not user:
+            return None
+
+        snapshot = {
+            attr.key: getattr(user, attr.key)
+            for attr in User.__mapper__.column_attrs
+            if attr.key != "password_hash"
+        }
+        # 按RedisCache的序列化方式（json，default=str）转换一次，无论是否命中缓存、
+        # 是否启用缓存，时间、UUID等字段的类型和格式都一致
+        snapshot = json.loads(json.dumps(snapshot, ensure_ascii=False, default=str))
+        if self.cache:
+            self.cache.set(f"user:email:{user.email}", snapshot, settings.USER_CACHE_TTL)
+            self.cache.set(f"user:id:{user.id}", snapshot, settings.USER_CACHE_TTL)
+        return snapshot
+
+    def _invalidate_user_cache(self, user_id: str) -> None:
+        """用户数据变更后清除快照缓存（按ID与邮箱两个键）"""
+        if not self.cache:
+            return
+        key = f"user:id:{user_id}"
+        snapshot = self.cache.get(key)
+        self.cache.delete(key)
+        if snapshot:
+            self.cache.delete(f"user:email:{snapshot['email']}")
 
     def get_user_by_username(self, username: str) -> Optional[User]:
         """通过用户名获取用户"""
-        return self.db.query(User).filter(User.username == username).first()
+        return self.db.execute(self._user_by_username_stmt, {"username": username}).scalar_one_or_none()
 
     def get_user_by_id(self, user_id: str) -> Optional[User]:
         """通过ID获取用户"""
-        return self.db.query(User).filter(User.id == user_id).first()
+        return self.db.execute(self._user_by_id_stmt, {"user_id": user_id}).scalar_one_or_none()
+
+    def _ensure_password_cost(self) -> None:
+        """首次生成密码哈希前应用系统配置password_hash_cost（由calibrate_password_cost写入）"""
+        if DatabaseOperations._password_cost_loaded:
+            return
+        config = self.get_system_config("password_hash_cost")
+        if config and config.value:
+            configure_password_hasher(config.value["time_cost"], config.value.get("memory_cost"))
+        DatabaseOperations._password_cost_loaded = True
+
+    def calibrate_password_cost(self, target_ms: float = 250) -> int:
+        """在本机测量并选出满足延迟目标的最大哈希强度，保存到系统配置并立即生效"""
+        time_cost = calibrate_time_cost(target_ms)
+        self.set_system_config(
+            "password_hash_cost",
+            {"time_cost": time_cost, "memory_cost": settings.PASSWORD_HASH_MEMORY_COST, "target_ms": target_ms},
+            description="密码哈希（argon2id）强度参数",
+            category="system"
+        )
+        configure_password_hasher(time_cost)
+        DatabaseOperations._password_cost_loaded = True
+        return time_cost
 
     def verify_password(self, user: User, password: str) -> bool:
         """验证密码"""
-        return bcrypt.checkpw(
-            password.encode('utf-8'),
-            user.password_hash.encode('utf-8')
-        )
+        return check_password(password, user.password_hash)
+
+    async def verify_password_async(self, user: User, password: str) -> bool:
+        """验证密码（在线程池中计算哈希，供async路由使用，不阻塞事件循环）"""
+        return await check_password_async(password, user.password_hash)
 
     def update_user_password(self, user_id: str, new_password: str) -> bool:
         """更新用户密码"""
@@ -72,63 +221,88 @@ class DatabaseOperations:
         if not user:
             return False
 
-        password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
-        user.password_hash = password_hash.decode('utf-8')
+        self._ensure_password_cost()
+        user.password_hash = hash_password(new_password)
         user.updated_at = datetime.utcnow()
 
         self.db.commit()
+        self._invalidate_user_cache(user_id)
         return True
 
-    def update_user_tokens(self, user_id: str, tokens_used: int) -> None:
-        """更新用户Token使用量"""
-        user = self.get_user_by_id(user_id)
-        if user:
-            user.total_tokens_used += tokens_used
-            user.updated_at = datetime.utcnow()
-            self.db.commit()
+    async def update_user_password_async(self, user_id: str, new_password: str) -> bool:
+        """更新用户密码（密码哈希在线程池中计算）"""
+        self._ensure_password_cost()
+        password_hash = await hash_password_async(new_password)
 
-    def update_user_preferences(self, user_id: str, preferences: Dict) -> bool:
-        """更新用户偏好设置"""
-        user = self.get_user_by_id(user_id)
-        if not user:
-            return False
+        result = self.db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(password_hash=password_hash, updated_at=datetime.utcnow())
+        )
+        self.db.commit()
+        self._invalidate_user_cache(user_id)
+        return result.rowcount > 0
 
-        # 合并偏好设置
-        current_prefs = user.preferences or {}
-        current_prefs.update(preferences)
-        user.preferences = current_prefs
-        user.updated_at = datetime.utcnow()
+    def update_user_tokens(self, user_id: str, tokens_used: int) -> None:
+        """更新用户Token使用量（数据库端原子累加，并发更新不会丢失）"""
+        self.db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(total_tokens_used=User.total_tokens_used + tokens_used, updated_at=datetime.utcnow())
+        )
+        self.db.commit()
+        self._invalidate_user_cache(user_id)
 
+    def update_user_preferences(self, user_id: str, preferences: Dict) -> bool:
+        """更新用户偏好设置（在数据库端合并，不先读出整份偏好）"""
+        result = self.db.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(preferences=self._json_merge(User.preferences, preferences), updated_at=datetime.utcnow())
+        )
         self.db.commit()
-        return True
+        self._invalidate_user_cache(user_id)
+        return result.rowcount > 0
 
     def update_user_last_login(self, user_id: str) -> None:
         """更新用户最后登录时间"""
-        user = self.get_user_by_id(user_id)
-        if user:
-            user.last_login = datetime.utcnow()
-            user.last_active = datetime.utcnow()
-            self.db.commit()
+        now = datetime.utcnow()
+        self.db.execute(update(User).where(User.id == user_id).values(last_login=now, last_active=now))
+        self.db.commit()
+        self._invalidate_user_cache(user_id)
 
     def get_user_statistics(self, user_id: str) -> Dict:
-        """获取用户统计信息"""
-        user = self.get_user_by_id(user_id)
-        if not user:
-            return {}
-
+        """获取用户统计信息（用户信息与两组聚合合并为一条查询）"""
         # 统计小说数量
-        novel_stats = self.db.query(
+        novel_stats = select(
             func.count(Novel.id).label('total'),
-            func.count(func.nullif(Novel.status, 'completed')).label('completed'),
-            func.sum(Novel.total_tokens).label('total_tokens')
-        ).filter(Novel.user_id == user_id).first()
+            func.count().filter(Novel.status == 'completed').label('completed')
+        ).where(Novel.user_id == user_id).subquery()
 
         # 统计生成日志
-        log_stats = self.db.query(
+        log_stats = select(
             func.count(GenerationLog.id).label('total_generations'),
-            func.sum(GenerationLog.tokens_used).label('tokens_used'),
             func.sum(GenerationLog.cost).label('total_cost')
-        ).filter(GenerationLog.user_id == user_id).first()
+        ).where(GenerationLog.user_id == user_id).subquery()
+
+        # 无GROUP BY的聚合子查询恒为一行，直接与用户行连接
+        row = self.db.query(
+            User,
+            novel_stats.c.total,
+            novel_stats.c.completed,
+            log_stats.c.total_generations,
+            log_stats.c.total_cost
+        ).options(
+            load_only(
+                User.id, User.username, User.email, User.subscription_tier, User.created_at,
+                User.last_login, User.total_words_generated, User.average_quality_score,
+                User.total_tokens_used
+            )
+        ).select_from(User).join(novel_stats, true()).join(log_stats, true()).filter(User.id == user_id).first()
+        if not row:
+            return {}
+
+        user = row.User
 
         return {
             "user_info": {
@@ -140,15 +314,15 @@ class DatabaseOperations:
                 "last_login": user.last_login
             },
             "novel_stats": {
-                "total_novels": novel_stats.total or 0,
-                "completed_novels": novel_stats.completed or 0,
+                "total_novels": row.total or 0,
+                "completed_novels": row.completed or 0,
                 "total_words": user.total_words_generated or 0,
                 "average_quality": user.average_quality_score or 0.0
             },
             "usage_stats": {
                 "total_tokens": user.total_tokens_used or 0,
-                "total_generations": log_stats.total_generations or 0,
-                "total_cost": log_stats.total_cost or 0.0
+                "total_generations": row.total_generations or 0,
+                "total_cost": row.total_cost or 0.0
             }
         }
 
@@ -156,26 +330,65 @@ class DatabaseOperations:
 
     def create_novel(self, user_id: str, title: str, **kwargs) -> Novel:
         """创建小说"""
-        novel = Novel(
+        [novel] = self._insert_returning(Novel, [dict(
             user_id=user_id,
             title=title,
             **kwargs
-        )
-
-        self.db.add(novel)
-        self.db.commit()
-        self.db.refresh(novel)
+        )])
         return novel
 
+    def create_novels(self, user_id: str, novels: List[Dict[str, Any]]) -> List[Novel]:
+        """批量创建小说，一条INSERT ... RETURNING写入全部行
+
+        每个字典的字段需一致（至少包含title）。
+        """
+        if not novels:
+            return []
+
+        return self._insert_returning(Novel, [{**novel, "user_id": user_id} for novel in novels])
+
     def get_novel_by_id(self, novel_id: str) -> Optional[Novel]:
         """通过ID获取小说"""
         return self.db.query(Novel).filter(Novel.id == novel_id).first()
 
+    def get_novel_with_chapters(self, novel_id: str) -> Optional[Novel]:
+        """获取小说并一次性预加载大纲与全部章节正文，避免逐章懒加载"""
+        return (
+            self.db.query(Novel)
+            .options(
+                undefer(Novel.outline),
+                selectinload(Novel.chapters_list).undefer(Chapter.content)
+            )
+            .filter(Novel.id == novel_id)
+            .first()
+        )
+
+    def export_novel_chapters_json(self, novel_id: str) -> Optional[bytes]:
+        """按章节顺序导出章节正文JSON，需要时从chapters表现场生成
+
+        只查询正文列并分批流式读取，不构造章节ORM对象。
+        """
+        if self.db.query(Novel.id).filter(Novel.id == novel_id).first() is None:
+            return None
+
+        contents = (
+            self.db.query(Chapter.content)
+            .filter(Chapter.novel_id == novel_id)
+            .order_by(Chapter.chapter_number)
+            .yield_per(100)
+        )
+        return orjson.dumps([content for (content,) in contents])
+
     def get_user_novels(self, user_id: str, status: str = None,
                         limit: int = 20, offset: int = 0,
                         order_by: str = "created_at", ascending: bool = False) -> List[Novel]:
-        """获取用户小说列表"""
-        query = self.db.query(Novel).filter(Novel.user_id == user_id)
+        """获取用户小说列表（章节与作者一并预加载，避免逐本小说懒加载）"""
+        query = (
+            self.db.query(Novel)
+            # 其余关系禁止懒加载，避免下游逐行触发查询
+            .options(selectinload(Novel.chapters_list), selectinload(Novel.user), raiseload("*"))
+            .filter(Novel.user_id == user_id)
+        )
 
         if status:
             query = query.filter(Novel.status == status)
@@ -193,7 +406,7 @@ class DatabaseOperations:
                       genre: str = None, status: str = None,
                       is_public: bool = None, limit: int = 20, offset: int = 0) -> List[Novel]:
         """搜索小说"""
-        db_query = self.db.query(Novel)
+        db_query = self.db.query(Novel).options(raiseload("*"))
 
         if user_id:
             db_query = db_query.filter(Novel.user_id == user_id)
@@ -208,7 +421,7 @@ class DatabaseOperations:
             db_query = db_query.filter(Novel.genre == genre)
 
         if query:
-            # 搜索标题和描述
+            # 搜索标题和描述（PostgreSQL上由pg_trgm的GIN索引支持，无需全表扫描）
             search_filter = or_(
                 Novel.title.contains(query),
                 Novel.subtitle.contains(query)
@@ -218,51 +431,89 @@ class DatabaseOperations:
         return db_query.order_by(desc(Novel.created_at)).limit(limit).offset(offset).all()
 
     def update_novel_status(self, novel_id: str, status: str, **kwargs) -> bool:
-        """更新小说状态"""
-        novel = self.get_novel_by_id(novel_id)
-        if not novel:
-            return False
-
-        novel.status = status
-        novel.updated_at = datetime.utcnow()
+        """更新小说状态（单条UPDATE，不先查询）"""
+        values = {"status": status, "updated_at": datetime.utcnow()}
 
         # 如果完成，记录完成时间
         if status == "completed":
-            novel.completed_at = datetime.utcnow()
+            values["completed_at"] = values["updated_at"]
 
         # 更新其他字段
-        for key, value in kwargs.items():
-            if hasattr(novel, key):
-                setattr(novel, key, value)
+        values.update(self._column_values(Novel, kwargs))
 
+        result = self.db.execute(update(Novel).where(Novel.id == novel_id).values(**values))
         self.db.commit()
-        return True
+        return result.rowcount > 0
 
     def save_novel_content(self, novel_id: str, outline: Dict = None,
                            chapters: List = None, metadata: Dict = None) -> bool:
-        """保存小说内容"""
-        novel = self.get_novel_by_id(novel_id)
-        if not novel:
-            return False
+        """保存小说内容（大纲与元数据用UPDATE写入，元数据在数据库端合并）
 
+        传入chapters时以其作为小说的完整章节列表：已有章节按章节号覆盖（内容未变化的行不重写），
+        新章节插入，列表中不再出现的章节号删除。
+        """
+        values = {"updated_at": datetime.utcnow()}
         if outline:
-            novel.outline = outline
+            values["outline"] = outline
+        if metadata:
+            values["meta"] = self._json_merge(Novel.meta, metadata)
 
-        if chapters:
-            novel.chapters = chapters
-            # 更新元数据
-            total_words = sum(ch.get('word_count', 0) for ch in chapters)
-            if not novel.metadata:
-                novel.metadata = {}
-            novel.metadata['total_words'] = total_words
-            novel.metadata['total_chapters'] = len(chapters)
+        result = self.db.execute(update(Novel).where(Novel.id == novel_id).values(**values))
+        if not result.rowcount:
+            self.db.rollback()
+            return False
 
-        if metadata:
-            if not novel.metadata:
-                novel.metadata = {}
-            novel.metadata.update(metadata)
+        if chapters:
+            rows = [
+                {
+                    'novel_id': novel_id,
+                    'chapter_number': ch.get('chapter_number', ch.get('chapter_num', i + 1)),
+                    'title': ch.get('title'),
+                    'content': ch.get('content'),
+                    'word_count': ch.get('word_count', 0),
+                }
+                for i, ch in enumerate(chapters)
+            ]
+            stmt = dialect_insert(self.db.get_bind().dialect.name)(Chapter)
+            changed = or_(
+                Chapter.title.is_distinct_from(stmt.excluded.title),
+                Chapter.content.is_distinct_from(stmt.excluded.content),
+                Chapter.word_count.is_distinct_from(stmt.excluded.word_count)
+            )
+            # 按小说+章节号唯一索引upsert；只更新内容确有变化的章节，避免无谓的行重写
+            self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["novel_id", "chapter_number"],
+                    set_={
+                        "title": stmt.excluded.title,
+                        "content": stmt.excluded.content,
+                        "word_count": stmt.excluded.word_count,
+                        "updated_at": datetime.utcnow()
+                    },
+                    where=changed
+                ),
+                rows
+            )
+            # 批量DELETE不经过ORM级联，先删除被移除章节的历史版本（SQLite不强制外键）
+            removed = select(Chapter.id).where(
+                Chapter.novel_id == novel_id,
+                Chapter.chapter_number.notin_([row['chapter_number'] for row in rows])
+            )
+            self.db.execute(delete(ChapterVersion).where(ChapterVersion.chapter_id.in_(removed)))
+            self.db.execute(delete(Chapter).where(Chapter.id.in_(removed)))
+
+            # 更新元数据：字数和章节数由chapters表聚合得出
+            total_chapters, total_words = self.db.query(
+                func.count(Chapter.id), func.coalesce(func.sum(Chapter.word_count), 0)
+            ).filter(Chapter.novel_id == novel_id).one()
+            self.db.execute(
+                update(Novel)
+                .where(Novel.id == novel_id)
+                .values(meta=self._json_merge(
+                    Novel.meta, {'total_words': total_words, 'total_chapters': total_chapters}
+                ))
+            )
 
-        novel.updated_at = datetime.utcnow()
         self.db.commit()
         return True
 
@@ -282,42 +533,96 @@ class DatabaseOperations:
 
     def update_novel_quality_scores(self, novel_id: str, quality_scores: Dict) -> bool:
         """更新小说质量评分"""
-        novel = self.get_novel_by_id(novel_id)
-        if not novel:
-            return False
-
-        novel.quality_scores = quality_scores
-        novel.updated_at = datetime.utcnow()
+        result = self.db.execute(
+            update(Novel)
+            .where(Novel.id == novel_id)
+            .values(quality_scores=quality_scores, updated_at=datetime.utcnow())
+        )
         self.db.commit()
-        return True
+        return result.rowcount > 0
 
     def increment_novel_views(self, novel_id: str) -> bool:
-        """增加小说浏览量"""
-        novel = self.get_novel_by_id(novel_id)
-        if not novel:
-            return False
+        """增加小说浏览量
+
+        有缓存时只在Redis中累加，由 flush_novel_views 定期批量写回数据库；
+        否则直接执行一条原子UPDATE。
+        """
+        if self.cache:
+            # 按主键确认小说存在（只读，不锁行），不存在时与直接UPDATE一样返回False
+            exists = self.db.execute(select(Novel.id).where(Novel.id == novel_id)).first()
+            if exists is None:
+                return False
+            self.cache.incr_counter("novel_views", str(novel_id))
+            return True
+
+        result = self.db.execute(self._add_views_stmt(), [{"novel_id": novel_id, "views": 1}])
+        self.db.commit()
+        return result.rowcount > 0
 
-        if not novel.reader_stats:
-            novel.reader_stats = {"view_count": 0}
+    def flush_novel_views(self) -> int:
+        """把Redis中累计的浏览量批量写回 reader_stats.view_count，返回涉及的小说数"""
+        if not self.cache:
+            return 0
 
-        novel.reader_stats["view_count"] = novel.reader_stats.get("view_count", 0) + 1
-        self.db.commit()
-        return True
+        counters = self.cache.pop_counters("novel_views")
+        if not counters:
+            return 0
+
+        try:
+            self.db.execute(
+                self._add_views_stmt(),
+                [{"novel_id": novel_id, "views": views} for novel_id, views in counters.items()]
+            )
+            self.db.commit()
+        except Exception:
+            # 写回失败时把取出的计数加回Redis，留给下一次写回
+            self.db.rollback()
+            for novel_id, views in counters.items():
+                self.cache.incr_counter("novel_views", novel_id, views)
+            raise
+        return len(counters)
+
+    def _add_views_stmt(self):
+        """reader_stats.view_count += :views 的单条UPDATE（在数据库端完成JSON字段累加）"""
+        novels = Novel.__table__
+        if self.db.get_bind().dialect.name == "postgresql":
+            stats = func.coalesce(novels.c.reader_stats, literal_column("'{}'::jsonb"))
+            current = func.coalesce(novels.c.reader_stats["view_count"].as_integer(), 0)
+            new_stats = func.jsonb_set(stats, literal_column("'{view_count}'"),
+                                       func.to_jsonb(current + bindparam("views")))
+        else:
+            stats = func.coalesce(novels.c.reader_stats, "{}")
+            current = func.coalesce(func.json_extract(novels.c.reader_stats, "$.view_count"), 0)
+            new_stats = func.json_set(stats, "$.view_count", current + bindparam("views"))
+
+        return novels.update().where(novels.c.id == bindparam("novel_id")).values(reader_stats=new_stats)
 
     # ==================== 章节操作 ====================
 
     def create_chapter(self, novel_id: str, chapter_number: int, **kwargs) -> Chapter:
         """创建章节"""
-        chapter = Chapter(
+        [chapter] = self._insert_returning(Chapter, [dict(
             novel_id=novel_id,
             chapter_number=chapter_number,
             **kwargs
-        )
+        )])
+        return chapter
+
+    def create_chapters(self, novel_id: str, chapters: List[Dict[str, Any]]) -> List[Any]:
+        """批量创建章节，一条INSERT写入全部章节，返回新章节ID列表
 
-        self.db.add(chapter)
+        每个字典的字段需一致（如 title/content/word_count），未提供chapter_number时按顺序编号。
+        """
+        if not chapters:
+            return []
+
+        rows = [
+            {**chapter, "novel_id": novel_id, "chapter_number": chapter.get("chapter_number", i + 1)}
+            for i, chapter in enumerate(chapters)
+        ]
+        chapter_ids = self.db.scalars(insert(Chapter).returning(Chapter.id), rows).all()
         self.db.commit()
-        self.db.refresh(chapter)
-        return chapter
+        return list(chapter_ids)
 
     def get_chapter_by_id(self, chapter_id: str) -> Optional[Chapter]:
         """获取章节"""
@@ -325,7 +630,7 @@ class DatabaseOperations:
 
     def get_novel_chapters(self, novel_id: str, order_by_number: bool = True) -> List[Chapter]:
         """获取小说的所有章节"""
-        query = self.db.query(Chapter).filter(Chapter.novel_id == novel_id)
+        query = self.db.query(Chapter).options(raiseload("*")).filter(Chapter.novel_id == novel_id)
 
         if order_by_number:
             query = query.order_by(Chapter.chapter_number)
@@ -334,36 +639,45 @@ class DatabaseOperations:
 
     def update_chapter_content(self, chapter_id: str, content: str,
                                word_count: int = None, **kwargs) -> bool:
-        """更新章节内容"""
-        chapter = self.get_chapter_by_id(chapter_id)
-        if not chapter:
-            return False
-
-        # 保存旧版本
-        if chapter.content and chapter.content != content:
-            old_version = {
-                'version': chapter.version,
-                'content': chapter.content,
-                'updated_at': chapter.updated_at.isoformat(),
-                'word_count': chapter.word_count
-            }
-
-            if not chapter.previous_versions:
-                chapter.previous_versions = []
-            chapter.previous_versions.append(old_version)
-
-        chapter.content = content
-        chapter.word_count = word_count or len(content.split())
-        chapter.version += 1
-        chapter.updated_at = datetime.utcnow()
+        """更新章节内容
+
+        旧正文在数据库端直接复制到chapter_versions（INSERT ... SELECT），不读回应用；
+        章节本身用单条UPDATE更新，版本号原子递增。
+        """
+        snapshot = select(
+            Chapter.id, Chapter.version, Chapter.content, Chapter.word_count, Chapter.updated_at
+        ).where(
+            Chapter.id == chapter_id,
+            Chapter.content.is_not(None),
+            Chapter.content != content
+        )
+        self.db.execute(
+            insert(ChapterVersion).from_select(
+                ["chapter_id", "version", "content", "word_count", "created_at"], snapshot
+            )
+        )
 
+        values = {
+            "content": content,
+            "word_count": word_count or count_words(content),
+            "version": Chapter.version + 1,
+            "updated_at": datetime.utcnow(),
+        }
         # 更新其他字段
-        for key, value in kwargs.items():
-            if hasattr(chapter, key):
-                setattr(chapter, key, value)
+        values.update(self._column_values(Chapter, kwargs))
 
+        result = self.db.execute(update(Chapter).where(Chapter.id == chapter_id).values(**values))
         self.db.commit()
-        return True
+        return result.rowcount > 0
+
+    def get_chapter_versions(self, chapter_id: str, include_content: bool = False,
+                             limit: int = 20, offset: int = 0) -> List[ChapterVersion]:
+        """分页获取章节历史版本（新版本在前），默认不加载正文"""
+        query = self.db.query(ChapterVersion).filter(ChapterVersion.chapter_id == chapter_id)
+        if include_content:
+            query = query.options(undefer(ChapterVersion.content))
+
+        return query.order_by(desc(ChapterVersion.version)).limit(limit).offset(offset).all()
 
     def delete_chapter(self, chapter_id: str) -> bool:
         """删除章节"""
@@ -378,21 +692,38 @@ class DatabaseOperations:
     # ==================== 日志操作 ====================
 
     def log_generation(self, novel_id: str, user_id: str, stage: str,
-                       status: str, **kwargs) -> GenerationLog:
-        """记录生成日志"""
-        log = GenerationLog(
+                       status: str, buffered: bool = True, **kwargs) -> Optional[GenerationLog]:
+        """记录生成日志
+
+        已启动后写队列（见 start_generation_log_writer）且buffered为True时，只把日志行放入队列
+        并返回None，由后台线程批量写入，调用方拿不到日志对象；需要返回的日志对象（如读取id）时
+        传入buffered=False，立即插入并返回。未启动后写队列时总是立即插入。
+        """
+        row = dict(
             novel_id=novel_id,
             user_id=user_id,
             stage=stage,
             status=status,
             **kwargs
         )
+        if buffered and _log_writer is not None:
+            # 记录入队时刻，而不是批量写入的时刻
+            row.setdefault("created_at", datetime.utcnow())
+            _log_writer.put(row)
+            return None
 
-        self.db.add(log)
-        self.db.commit()
-        self.db.refresh(log)
+        [log] = self._insert_returning(GenerationLog, [row])
         return log
 
+    def log_generations(self, entries: List[Dict[str, Any]]) -> int:
+        """批量记录生成日志（如在每个阶段结束时统一写入），返回写入条数"""
+        if not entries:
+            return 0
+
+        self.db.execute(insert(GenerationLog), entries)
+        self.db.commit()
+        return len(entries)
+
     def get_generation_logs(self, novel_id: str = None, user_id: str = None,
                             stage: str = None, status: str = None,
                             limit: int = 100, offset: int = 0) -> List[GenerationLog]:
@@ -417,38 +748,38 @@ class DatabaseOperations:
         """获取生成统计"""
         cutoff = datetime.utcnow() - timedelta(days=days)
 
-        logs = self.db.query(GenerationLog).filter(
+        # 在数据库端按阶段聚合，只返回每个阶段一行
+        rows = self.db.query(
+            GenerationLog.stage,
+            func.count(GenerationLog.id),
+            func.coalesce(func.sum(GenerationLog.tokens_used), 0),
+            func.coalesce(func.sum(GenerationLog.cost), 0),
+            func.count().filter(GenerationLog.status == 'success'),
+            func.count().filter(GenerationLog.status == 'failed')
+        ).filter(
             GenerationLog.user_id == user_id,
             GenerationLog.created_at >= cutoff
-        ).all()
+        ).group_by(GenerationLog.stage).all()
 
-        total_tokens = sum(log.tokens_used or 0 for log in logs)
-        total_cost = sum(log.cost or 0 for log in logs)
-        success_count = sum(1 for log in logs if log.status == 'success')
-        failed_count = sum(1 for log in logs if log.status == 'failed')
-
-        # 按阶段统计
+        total_count = total_tokens = total_cost = success_count = failed_count = 0
         stage_stats = {}
-        for log in logs:
-            stage = log.stage
-            if stage not in stage_stats:
-                stage_stats[stage] = {"total": 0, "success": 0, "failed": 0}
-
-            stage_stats[stage]["total"] += 1
-            if log.status == "success":
-                stage_stats[stage]["success"] += 1
-            elif log.status == "failed":
-                stage_stats[stage]["failed"] += 1
+        for stage, count, tokens, cost, success, failed in rows:
+            stage_stats[stage] = {"total": count, "success": success, "failed": failed}
+            total_count += count
+            total_tokens += tokens
+            total_cost += cost
+            success_count += success
+            failed_count += failed
 
         return {
             'period_days': days,
-            'total_generations': len(logs),
+            'total_generations': total_count,
             'success_count': success_count,
             'failed_count': failed_count,
-            'success_rate': success_count / len(logs) if logs else 0,
+            'success_rate': success_count / total_count if total_count else 0,
             'total_tokens': total_tokens,
             'total_cost': total_cost,
-            'average_tokens': total_tokens / len(logs) if logs else 0,
+            'average_tokens': total_tokens / total_count if total_count else 0,
             'stage_stats': stage_stats
         }
 
@@ -457,17 +788,13 @@ class DatabaseOperations:
     def create_template(self, user_id: str, name: str, template_type: str,
                         content: Dict, **kwargs) -> UserTemplate:
         """创建用户模板"""
-        template = UserTemplate(
+        [template] = self._insert_returning(UserTemplate, [dict(
             user_id=user_id,
             name=name,
             template_type=template_type,
             content=content,
             **kwargs
-        )
-
-        self.db.add(template)
-        self.db.commit()
-        self.db.refresh(template)
+        )])
         return template
 
     def get_template_by_id(self, template_id: str) -> Optional[UserTemplate]:
@@ -498,15 +825,14 @@ class DatabaseOperations:
         return query.order_by(desc(UserTemplate.usage_count)).limit(limit).offset(offset).all()
 
     def update_template_usage(self, template_id: str) -> bool:
-        """更新模板使用次数"""
-        template = self.get_template_by_id(template_id)
-        if not template:
-            return False
-
-        template.usage_count += 1
-        template.updated_at = datetime.utcnow()
+        """更新模板使用次数（数据库端原子累加）"""
+        result = self.db.execute(
+            update(UserTemplate)
+            .where(UserTemplate.id == template_id)
+            .values(usage_count=UserTemplate.usage_count + 1, updated_at=datetime.utcnow())
+        )
         self.db.commit()
-        return True
+        return result.rowcount > 0
 
     def delete_template(self, template_id: str, user_id: str = None) -> bool:
         """删除模板"""
@@ -527,16 +853,12 @@ class DatabaseOperations:
     def create_api_key(self, user_id: str, provider: str,
                        api_key_encrypted: str, **kwargs) -> UserAPIKey:
         """创建API密钥"""
-        api_key = UserAPIKey(
+        [api_key] = self._insert_returning(UserAPIKey, [dict(
             user_id=user_id,
             provider=provider,
             api_key_encrypted=api_key_encrypted,
             **kwargs
-        )
-
-        self.db.add(api_key)
-        self.db.commit()
-        self.db.refresh(api_key)
+        )])
         return api_key
 
     def get_user_api_keys(self, user_id: str, provider: str = None,
@@ -553,75 +875,86 @@ class DatabaseOperations:
         return query.all()
 
     def update_api_key_usage(self, api_key_id: str, tokens_used: int, cost: float) -> bool:
-        """更新API密钥使用统计"""
-        api_key = self.db.query(UserAPIKey).filter(UserAPIKey.id == api_key_id).first()
-        if not api_key:
-            return False
-
-        api_key.total_tokens_used += tokens_used
-        api_key.total_cost += cost
-        api_key.total_requests += 1
-        api_key.successful_requests += 1
-        api_key.last_used = datetime.utcnow()
-        api_key.updated_at = datetime.utcnow()
-
+        """更新API密钥使用统计（数据库端原子累加）"""
+        now = datetime.utcnow()
+        result = self.db.execute(
+            update(UserAPIKey)
+            .where(UserAPIKey.id == api_key_id)
+            .values(
+                total_tokens_used=UserAPIKey.total_tokens_used + tokens_used,
+                total_cost=UserAPIKey.total_cost + cost,
+                total_requests=UserAPIKey.total_requests + 1,
+                successful_requests=UserAPIKey.successful_requests + 1,
+                last_used=now,
+                updated_at=now
+            )
+        )
         self.db.commit()
-        return True
+        return result.rowcount > 0
 
     # ==================== 系统配置操作 ====================
 
     def get_system_config(self, key: str) -> Optional[SystemConfig]:
-        """获取系统配置"""
-        return self.db.query(SystemConfig).filter(SystemConfig.key == key).first()
+        """获取系统配置（进程内缓存SYSTEM_CONFIG_LOCAL_TTL秒，返回的对象应视为只读）"""
+        return _local_cached(
+            f"config:{key}",
+            lambda: self._detached(self.db.query(SystemConfig).filter(SystemConfig.key == key).first())
+        )
 
     def set_system_config(self, key: str, value: Any, description: str = None,
                           category: str = "system") -> SystemConfig:
-        """设置系统配置"""
-        config = self.get_system_config(key)
-
-        if config:
-            config.value = value
-            if description:
-                config.description = description
-            config.updated_at = datetime.utcnow()
-        else:
-            config = SystemConfig(
-                key=key,
-                value=value,
-                description=description,
-                category=category
-            )
-            self.db.add(config)
+        """设置系统配置（INSERT ... ON CONFLICT DO UPDATE ... RETURNING，一次往返完成）"""
+        stmt = dialect_insert(self.db.get_bind().dialect.name)(SystemConfig).values(
+            key=key,
+            value=value,
+            description=description,
+            category=category
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={
+                "value": stmt.excluded.value,
+                # 未提供说明时保留原有说明
+                "description": func.coalesce(stmt.excluded.description, SystemConfig.description),
+                "updated_at": datetime.utcnow()
+            }
+        ).returning(SystemConfig)
 
+        config = self.db.scalars(stmt, execution_options={"populate_existing": True}).one()
         self.db.commit()
-        self.db.refresh(config)
+        _invalidate_local_config(key)
+        return config
+
+    def _detached(self, config: Optional[SystemConfig]) -> Optional[SystemConfig]:
+        """将要放入进程内缓存的配置对象移出当前会话，避免该会话回滚时被置为过期"""
+        if config is not None:
+            self.db.expunge(config)
         return config
 
     def get_public_configs(self, category: str = None) -> List[SystemConfig]:
-        """获取公开配置"""
+        """获取公开配置（进程内缓存SYSTEM_CONFIG_LOCAL_TTL秒，返回的对象应视为只读）"""
         query = self.db.query(SystemConfig).filter(SystemConfig.is_public == True)
 
         if category:
             query = query.filter(SystemConfig.category == category)
 
-        return query.all()
+        return _local_cached(
+            f"public_configs:{category or '*'}",
+            lambda: [self._detached(config) for config in query.all()]
+        )
 
     # ==================== 任务队列操作 ====================
 
     def create_task(self, task_id: str, user_id: str, task_type: str,
                     task_data: Dict, priority: int = 0) -> TaskQueue:
         """创建任务"""
-        task = TaskQueue(
+        [task] = self._insert_returning(TaskQueue, [dict(
             task_id=task_id,
             user_id=user_id,
             task_type=task_type,
             task_data=task_data,
             priority=priority
-        )
-
-        self.db.add(task)
-        self.db.commit()
-        self.db.refresh(task)
+        )])
         return task
 
     def get_pending_tasks(self, task_type: str = None, limit: int = 10) -> List[TaskQueue]:
@@ -664,67 +997,110 @@ class DatabaseOperations:
 
     # ==================== 统计和分析 ====================
 
+    def _cached(self, key: str, expire: int, compute):
+        """有缓存时先读缓存，未命中再计算并写入；数据变化靠过期时间刷新"""
+        if not self.cache:
+            return compute()
+        value = self.cache.get(key)
+        if value is None:
+            value = compute()
+            self.cache.set(key, value, expire)
+        return value
+
     def get_system_statistics(self) -> Dict:
-        """获取系统统计信息"""
+        """获取系统统计信息（聚合结果缓存STATS_CACHE_TTL秒）"""
+        stats = self._cached("sysstats:v1", settings.STATS_CACHE_TTL, self._compute_system_statistics)
+        # 最常用模板是ORM对象，不放入缓存；内存后备缓存返回的是共享对象，
+        # 因此构造新的字典，不修改缓存中的结果
+        return {
+            **stats,
+            'templates': {
+                **stats['templates'],
+                'most_used': self.db.query(UserTemplate).order_by(desc(UserTemplate.usage_count)).first()
+            }
+        }
+
+    def _compute_system_statistics(self) -> Dict:
+        """计算系统统计信息（每张表一条多聚合查询）"""
+        now = datetime.utcnow()
         stats = {}
 
         # 用户统计
+        users = self.db.query(
+            func.count(User.id),
+            func.count().filter(User.last_active >= now - timedelta(days=1)),
+            func.count().filter(User.created_at >= now - timedelta(days=30))
+        ).one()
         stats['users'] = {
-            'total': self.db.query(User).count(),
-            'active_today': self.db.query(User).filter(
-                User.last_active >= datetime.utcnow() - timedelta(days=1)
-            ).count(),
-            'new_this_month': self.db.query(User).filter(
-                User.created_at >= datetime.utcnow() - timedelta(days=30)
-            ).count()
+            'total': users[0],
+            'active_today': users[1],
+            'new_this_month': users[2]
         }
 
         # 小说统计
+        novels = self.db.query(
+            func.count(Novel.id),
+            func.count().filter(Novel.status == 'completed'),
+            func.count().filter(Novel.status.in_(['generating', 'draft'])),
+            func.count().filter(Novel.is_public == True)
+        ).one()
         stats['novels'] = {
-            'total': self.db.query(Novel).count(),
-            'completed': self.db.query(Novel).filter(Novel.status == 'completed').count(),
-            'in_progress': self.db.query(Novel).filter(Novel.status.in_(['generating', 'draft'])).count(),
-            'public': self.db.query(Novel).filter(Novel.is_public == True).count()
+            'total': novels[0],
+            'completed': novels[1],
+            'in_progress': novels[2],
+            'public': novels[3]
         }
 
-        # 生成统计
-        today = datetime.utcnow().date()
+        # 生成统计（按当天零点比较，可利用created_at索引）
+        today_start = datetime.combine(now.date(), datetime.min.time())
+        logs = self.db.query(
+            func.count(GenerationLog.id),
+            func.count().filter(GenerationLog.created_at >= today_start),
+            func.count().filter(GenerationLog.status == 'success'),
+            func.coalesce(func.sum(GenerationLog.tokens_used), 0)
+        ).one()
         stats['generation'] = {
-            'total_logs': self.db.query(GenerationLog).count(),
-            'today_generations': self.db.query(GenerationLog).filter(
-                func.date(GenerationLog.created_at) == today
-            ).count(),
-            'success_rate': self._calculate_success_rate(),
-            'total_tokens': self.db.query(func.sum(GenerationLog.tokens_used)).scalar() or 0
+            'total_logs': logs[0],
+            'today_generations': logs[1],
+            'success_rate': logs[2] / logs[0] if logs[0] else 0.0,
+            'total_tokens': logs[3]
         }
 
         # 模板统计
+        templates = self.db.query(
+            func.count(UserTemplate.id),
+            func.count().filter(UserTemplate.is_public == True)
+        ).one()
         stats['templates'] = {
-            'total': self.db.query(UserTemplate).count(),
-            'public': self.db.query(UserTemplate).filter(UserTemplate.is_public == True).count(),
-            'most_used': self.db.query(UserTemplate).order_by(desc(UserTemplate.usage_count)).first()
+            'total': templates[0],
+            'public': templates[1]
         }
 
         return stats
 
     def _calculate_success_rate(self) -> float:
         """计算成功率"""
-        total = self.db.query(GenerationLog).count()
-        if total == 0:
-            return 0.0
+        def compute() -> float:
+            total, success = self.db.query(
+                func.count(GenerationLog.id),
+                func.count().filter(GenerationLog.status == 'success')
+            ).one()
+            return success / total if total else 0.0
 
-        success = self.db.query(GenerationLog).filter(GenerationLog.status == 'success').count()
-        return success / total
+        return self._cached("genlog:success_rate", settings.STATS_CACHE_TTL, compute)
 
     def get_popular_genres(self, limit: int = 10) -> List[Tuple[str, int]]:
         """获取热门类型"""
-        result = self.db.query(
-            Novel.genre,
-            func.count(Novel.id).label('count')
-        ).filter(
-            Novel.genre.isnot(None)
-        ).group_by(Novel.genre).order_by(desc('count')).limit(limit).all()
-
+        def compute() -> List[List]:
+            result = self.db.query(
+                Novel.genre,
+                func.count(Novel.id).label('count')
+            ).filter(
+                Novel.genre.isnot(None)
+            ).group_by(Novel.genre).order_by(desc('count')).limit(limit).all()
+            return [[genre, count] for genre, count in result]
+
+        result = self._cached(f"novels:popular_genres:{limit}", settings.POPULAR_GENRES_CACHE_TTL, compute)
         return [(genre, count) for genre, count in result]
 
     def get_user_activity_trend(self, days: int = 30) -> List[Dict]:
@@ -746,21 +1122,173 @@ class DatabaseOperations:
         """清理旧日志"""
         cutoff = datetime.utcnow() - timedelta(days=days)
 
-        deleted = self.db.query(GenerationLog).filter(
-            GenerationLog.created_at < cutoff
-        ).delete()
-
-        self.db.commit()
-        return deleted
+        return delete_in_batches(self.db, GenerationLog, GenerationLog.created_at < cutoff)
 
     def cleanup_failed_tasks(self, days: int = 7) -> int:
         """清理失败任务"""
         cutoff = datetime.utcnow() - timedelta(days=days)
 
-        deleted = self.db.query(TaskQueue).filter(
+        return delete_in_batches(
+            self.db, TaskQueue,
             TaskQueue.status == 'failed',
             TaskQueue.created_at < cutoff
-        ).delete()
+        )
 
-        self.db.commit()
-        return deleted
\ No newline at end of file
+
+# ==================== 生成日志后写队列 ====================
+
+class GenerationLogWriter:
+    """生成日志后写队列
+
+    日志行先放入内存队列，后台线程每隔flush_interval秒或攒够batch_size条，
+    用一次多行INSERT和一次提交写入数据库，避免生成过程中每条日志单独提交。
+    进程退出时调用 stop() 写完队列中剩余的日志。
+    """
+
+    # 单批日志写入失败时的重试次数
+    FLUSH_RETRIES = 3
+
+    def __init__(self, flush_interval: float = None, batch_size: int = None):
+        self.flush_interval = flush_interval or settings.GENERATION_LOG_FLUSH_INTERVAL
+        self.batch_size = batch_size or settings.GENERATION_LOG_BATCH_SIZE
+        self._queue: queue.Queue = queue.Queue()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="generation-log-writer", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def put(self, row: Dict[str, Any]) -> None:
+        self._queue.put_nowait(row)
+
+    def stop(self) -> None:
+        """停止后台线程并写入剩余日志"""
+        self._stopping.set()
+        self._thread.join()
+        remaining = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if remaining:
+            self._flush(remaining)
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._collect()
+            if batch:
+                self._flush(batch)
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        """最多等待flush_interval秒，收集不超过batch_size条日志"""
+        deadline = time.monotonic() + self.flush_interval
+        batch = []
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        """写入一批日志，失败时退避重试；仍然失败则放回队列等下一轮，停止时才放弃"""
+        for attempt in range(self.FLUSH_RETRIES):
+            # 后台线程使用独立会话，不占用请求线程的会话
+            session = get_session()
+            try:
+                DatabaseOperations(session).log_generations(batch)
+                return
+            except Exception as e:
+                session.rollback()
+                logger.warning(f"批量写入生成日志失败（第{attempt + 1}次）: {e}")
+            finally:
+                session.close()
+            # 停止时不再等待，直接进入下一次重试
+            self._stopping.wait(0.5 * 2 ** attempt)
+
+        if self._stopping.is_set():
+            logger.error(f"应用关闭时生成日志仍无法写入，丢弃{len(batch)}条")
+            return
+        for row in batch:
+            self._queue.put_nowait(row)
+
+
+_log_writer: Optional[GenerationLogWriter] = None
+
+
+def start_generation_log_writer() -> GenerationLogWriter:
+    """启动生成日志后写队列（应用启动时调用一次）"""
+    global _log_writer
+    if _log_writer is None:
+        _log_writer = GenerationLogWriter()
+        _log_writer.start()
+    return _log_writer
+
+
+def stop_generation_log_writer() -> None:
+    """停止后写队列并写入剩余日志（应用关闭时调用）；之后的日志恢复为立即写入"""
+    global _log_writer
+    writer, _log_writer = _log_writer, None
+    if writer is not None:
+        writer.stop()
+
+
+# ==================== 浏览量定期写回 ====================
+
+class NovelViewsFlusher:
+    """后台线程每隔interval秒调用一次 flush_novel_views，把Redis中累计的浏览量写回数据库
+
+    进程退出时调用 stop() 再写回一次。
+    """
+
+    def __init__(self, cache, interval: float = None):
+        self.cache = cache
+        self.interval = interval or settings.NOVEL_VIEWS_FLUSH_INTERVAL
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="novel-views-flusher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止后台线程并写回剩余的浏览量"""
+        self._stopping.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            self.flush()
+
+    def flush(self) -> None:
+        session = get_session()
+        try:
+            DatabaseOperations(session, self.cache).flush_novel_views()
+        except Exception as e:
+            logger.error(f"写回小说浏览量失败: {e}")
+        finally:
+            session.close()
+
+
+_views_flusher: Optional[NovelViewsFlusher] = None
+
+
+def start_novel_views_flusher(cache) -> NovelViewsFlusher:
+    """启动浏览量定期写回（应用启动时调用一次）"""
+    global _views_flusher
+    if _views_flusher is None:
+        _views_flusher = NovelViewsFlusher(cache)
+        _views_flusher.start()
+    return _views_flusher
+
+
+def stop_novel_views_flusher() -> None:
+    """停止定期写回并写回剩余的浏览量（应用关闭时调用）"""
+    global _views_flusher
+    flusher, _views_flusher = _views_flusher, None
+    if flusher is not None:
+        flusher.stop()
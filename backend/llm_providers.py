@@ -1,19 +1,60 @@
 # llm_providers.py - 多模型LLM支持
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, AsyncGenerator
+from typing import List, Dict, Optional, AsyncGenerator, AsyncIterator
 import asyncio
+import hashlib
 import aiohttp
+import httpx
 import openai
 import anthropic
 from dashscope import Generation as QwenGeneration
 import json
+import orjson
+import re
+import time
 import tiktoken
 from tenacity import retry, stop_after_attempt, wait_exponential
 import logging
 
+from config import settings
+from text_utils import text_digest_cache
+
 logger = logging.getLogger(__name__)
 
 
+@text_digest_cache(maxsize=4096)
+def _count_tiktoken(encoding_name: str, text: str) -> int:
+    """按编码缓存Token计数（键为文本摘要，不保留文本本身，见 text_digest_cache）
+
+    同一提示词在失败回退、并行对比、成本估算中会被多个使用相同编码的提供商重复计数，
+    缓存后只编码一次。encode_ordinary不检查特殊token，比encode更快，文本中出现
+    <|endoftext|>等字符串时也不会报错。
+    """
+    return len(tiktoken.get_encoding(encoding_name).encode_ordinary(text))
+
+
+def clear_token_count_cache():
+    """清空Token计数缓存"""
+    _count_tiktoken.cache_clear()
+
+
+_CJK_CHAR = re.compile('[\u4e00-\u9fff]')
+
+
+def _estimate_cjk_tokens(text: str) -> int:
+    """按字符估算Token数（没有官方分词器的提供商使用）
+
+    中文大约1.5个字符一个token，其他字符大约4个一个token；
+    用正则在C层统计汉字数，不在Python中逐字符遍历长篇正文；
+    纯ASCII文本（isascii在CPython中为O(1)）不含汉字，直接跳过扫描。
+    """
+    if text.isascii():
+        return int(len(text) / 4)
+    chinese_chars = len(_CJK_CHAR.findall(text))
+    english_chars = len(text) - chinese_chars
+    return int(chinese_chars / 1.5 + english_chars / 4)
+
+
 # ==================== 基础抽象类 ====================
 
 class LLMProvider(ABC):
@@ -52,11 +93,20 @@ class LLMProvider(ABC):
         """计算Token数"""
         pass
 
+    @property
+    def token_counter_key(self) -> Optional[str]:
+        """Token计数方式的标识：标识相同的提供商对同一文本的计数结果相同，可以共用；None表示不共用"""
+        return None
+
     @abstractmethod
     def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
         """估算成本"""
         pass
 
+    async def aclose(self):
+        """释放提供商持有的连接池等资源"""
+        pass
+
 
 # ==================== OpenAI 提供商 ====================
 
@@ -65,9 +115,15 @@ class OpenAIProvider(LLMProvider):
 
     def __init__(self, api_key: str, model: str = None, base_url: str = None):
         super().__init__(api_key, model)
-        openai.api_key = api_key
-        if base_url:
-            openai.api_base = base_url  # 支持代理
+        # 每个提供商持有独立客户端和连接池，不修改openai模块的全局配置，可被多个协程并发使用
+        self.client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,  # 支持代理
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30),
+                timeout=httpx.Timeout(120.0, connect=10.0)
+            )
+        )
 
         # Token计数器
         try:
@@ -92,7 +148,7 @@ class OpenAIProvider(LLMProvider):
         messages.append({"role": "user", "content": prompt})
 
         try:
-            response = await openai.ChatCompletion.acreate(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages,
                 max_tokens=kwargs.get('max_tokens', self.max_tokens),
@@ -104,7 +160,7 @@ class OpenAIProvider(LLMProvider):
 
             return response.choices[0].message.content
 
-        except openai.error.RateLimitError as e:
+        except openai.RateLimitError as e:
             logger.warning(f"Rate limit hit: {e}")
             await asyncio.sleep(10)
             raise
@@ -119,7 +175,7 @@ class OpenAIProvider(LLMProvider):
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
 
-        response = await openai.ChatCompletion.acreate(
+        stream = await self.client.chat.completions.create(
             model=self.model,
             messages=messages,
             max_tokens=kwargs.get('max_tokens', self.max_tokens),
@@ -127,13 +183,21 @@ class OpenAIProvider(LLMProvider):
             stream=True
         )
 
-        async for chunk in response:
-            if chunk.choices[0].delta.get('content'):
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
                 yield chunk.choices[0].delta.content
 
     def count_tokens(self, text: str) -> int:
-        """计算Token数"""
-        return len(self.encoding.encode(text))
+        """计算Token数（结果按编码缓存，见 _count_tiktoken）"""
+        return _count_tiktoken(self.encoding.name, text)
+
+    @property
+    def token_counter_key(self) -> Optional[str]:
+        return f"tiktoken:{self.encoding.name}"
+
+    async def aclose(self):
+        """关闭客户端及其连接池"""
+        await self.client.close()
 
     def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
         """估算成本（美元）"""
@@ -216,6 +280,10 @@ class AnthropicProvider(LLMProvider):
         # 粗略估算：平均每个字符0.25个token
         return int(len(text) * 0.25)
 
+    @property
+    def token_counter_key(self) -> Optional[str]:
+        return "chars/4"
+
     def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
         """估算成本（美元）"""
         pricing = {
@@ -293,10 +361,11 @@ class QwenProvider(LLMProvider):
 
     def count_tokens(self, text: str) -> int:
         """估算Token数"""
-        # 中文大约1.5个字符一个token
-        chinese_chars = len([c for c in text if '\u4e00' <= c <= '\u9fff'])
-        english_chars = len(text) - chinese_chars
-        return int(chinese_chars / 1.5 + english_chars / 4)
+        return _estimate_cjk_tokens(text)
+
+    @property
+    def token_counter_key(self) -> Optional[str]:
+        return "cjk_estimate"
 
     def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
         """估算成本（人民币）"""
@@ -315,12 +384,76 @@ class QwenProvider(LLMProvider):
 
 # ==================== 月之暗面 Moonshot 提供商 ====================
 
+def _sse_data_field(event: bytes) -> Optional[bytes]:
+    """取出一个SSE事件的data字段（多行data按换行拼接），没有data行时返回None"""
+    lines = [line[5:] for line in event.split(b"\n") if line.startswith(b"data:")]
+    if not lines:
+        return None
+    return b"\n".join(line[1:] if line.startswith(b" ") else line for line in lines)
+
+
+async def _iter_sse_data(chunks: AsyncIterator[bytes]) -> AsyncGenerator[bytes, None]:
+    """从字节块流中解析SSE事件，逐个产出data字段
+
+    字节块追加到复用的缓冲区，行尾统一为\n（兼容CRLF和CR），按空行切分事件，
+    不再逐行生成bytes对象；流结束时处理缓冲区中没有以空行结尾的最后一个事件。
+    """
+    buffer = bytearray()
+    carry_cr = False
+    async for data in chunks:
+        if carry_cr:
+            data = b"\r" + data
+        # CRLF可能被切在两个块之间，末尾的\r留到下一块再统一处理
+        carry_cr = data.endswith(b"\r")
+        if carry_cr:
+            data = data[:-1]
+        buffer += data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        while (end := buffer.find(b"\n\n")) != -1:
+            field = _sse_data_field(bytes(buffer[:end]))
+            del buffer[:end + 2]
+            if field is not None:
+                yield field
+
+    field = _sse_data_field(bytes(buffer))
+    if field is not None:
+        yield field
+
+
 class MoonshotProvider(LLMProvider):
     """月之暗面Kimi模型提供商"""
 
     def __init__(self, api_key: str, model: str = None):
         super().__init__(api_key, model)
         self.base_url = "https://api.moonshot.cn/v1"
+        # 提供商生命周期内复用同一个会话及其连接池，避免每次请求重新建立TCP+TLS连接
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """首次使用时创建会话（ClientSession需要在事件循环中创建）"""
+        if self._session is None or self._session.closed:
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    connector = aiohttp.TCPConnector(
+                        limit=100,
+                        limit_per_host=20,
+                        keepalive_timeout=30,
+                        ttl_dns_cache=300,
+                        enable_cleanup_closed=True
+                    )
+                    # 流式输出可能持续较久，不限制总时长，只限制连接和两次读取之间的间隔
+                    self._session = aiohttp.ClientSession(
+                        connector=connector,
+                        timeout=aiohttp.ClientTimeout(total=None, connect=10, sock_read=120)
+                    )
+        return self._session
+
+    async def aclose(self):
+        """关闭共享会话"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
     @property
     def default_model(self) -> str:
@@ -349,14 +482,14 @@ class MoonshotProvider(LLMProvider):
             "temperature": kwargs.get('temperature', self.temperature)
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=data
-            ) as response:
-                result = await response.json()
-                return result["choices"][0]["message"]["content"]
+        session = await self._get_session()
+        async with session.post(
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json=data
+        ) as response:
+            result = orjson.loads(await response.read())
+            return result["choices"][0]["message"]["content"]
 
     async def generate_stream(self, prompt: str, system_prompt: str = None, **kwargs) -> AsyncGenerator[str, None]:
         """流式生成"""
@@ -378,30 +511,31 @@ class MoonshotProvider(LLMProvider):
             "stream": True
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=headers,
-                    json=data
-            ) as response:
-                async for line in response.content:
-                    if line:
-                        line_text = line.decode('utf-8').strip()
-                        if line_text.startswith("data: "):
-                            if line_text == "data: [DONE]":
-                                break
-                            try:
-                                chunk = json.loads(line_text[6:])
-                                if chunk["choices"][0]["delta"].get("content"):
-                                    yield chunk["choices"][0]["delta"]["content"]
-                            except json.JSONDecodeError:
-                                continue
+        session = await self._get_session()
+        async with session.post(
+                f"{self.base_url}/chat/completions",
+                headers=headers,
+                json=data
+        ) as response:
+            async for payload in _iter_sse_data(response.content.iter_chunked(8192)):
+                payload = payload.strip()
+                if payload == b"[DONE]":
+                    return
+                try:
+                    chunk = orjson.loads(payload)
+                except orjson.JSONDecodeError:
+                    continue
+                content = chunk["choices"][0]["delta"].get("content")
+                if content:
+                    yield content
 
     def count_tokens(self, text: str) -> int:
         """估算Token数"""
-        chinese_chars = len([c for c in text if '\u4e00' <= c <= '\u9fff'])
-        english_chars = len(text) - chinese_chars
-        return int(chinese_chars / 1.5 + english_chars / 4)
+        return _estimate_cjk_tokens(text)
+
+    @property
+    def token_counter_key(self) -> Optional[str]:
+        return "cjk_estimate"
 
     def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
         """估算成本（人民币转美元）"""
@@ -421,9 +555,15 @@ class MoonshotProvider(LLMProvider):
 class MultiModelManager:
     """多模型管理器"""
 
-    def __init__(self):
+    def __init__(self, cache=None):
         self.providers: Dict[str, LLMProvider] = {}
         self.default_provider = None
+        # 可选的RedisCache，缓存低温度调用的响应（多进程共享）
+        self.cache = cache
+        # 进行中的相同请求：{缓存键: [Task, 等待方数量]}，并发的相同请求只调用一次上游
+        self._inflight: Dict[str, list] = {}
+        # 各提供商调用耗时的指数移动平均（秒），用于回退时的排序
+        self._latency: Dict[LLMProvider, float] = {}
 
     def register_provider(self, name: str, provider: LLMProvider, is_default: bool = False):
         """注册提供商"""
@@ -438,29 +578,71 @@ class MultiModelManager:
             return self.providers.get(name)
         return self.providers.get(self.default_provider)
 
-    async def generate_with_fallback(self, prompt: str, providers: List[str] = None, **kwargs) -> str:
-        """带失败回退的生成"""
+    async def generate_with_fallback(self, prompt: str, providers: List[str] = None,
+                                     hedge_delay: float = None, **kwargs) -> str:
+        """带失败回退的对冲生成
+
+        先请求第一个提供商；它失败时立即请求下一个。最近发起的请求明显慢于该提供商的
+        平均耗时（见 _hedge_timeout）时，也并行追加下一个，返回最先成功的结果并取消其余请求。
+        hedge_delay可指定固定的对冲延迟（秒）。未指定providers时按观测到的平均耗时排序，
+        指定时保持调用方给出的优先顺序。
+        """
+        if hedge_delay is None and settings.LLM_HEDGE_DELAY > 0:
+            hedge_delay = settings.LLM_HEDGE_DELAY
         if not providers:
-            providers = list(self.providers.keys())
+            providers = sorted(self.providers.keys(),
+                               key=lambda name: self._latency.get(self.providers[name], 0.0))
+
+        candidates = iter([(name, self.providers[name]) for name in providers if name in self.providers])
+        pending: Dict[asyncio.Task, str] = {}
+        # 最近发起的请求：(提供商, 发起时刻)，对冲延迟以它为基准
+        latest = []
+
+        def launch_next() -> bool:
+            candidate = next(candidates, None)
+            if candidate is None:
+                return False
+            name, provider = candidate
+            logger.info(f"Trying provider: {name}")
+            pending[asyncio.create_task(self._generate_cached(provider, prompt, **kwargs))] = name
+            latest[:] = [provider, time.monotonic()]
+            return True
 
         last_error = None
-        for provider_name in providers:
-            provider = self.providers.get(provider_name)
-            if not provider:
-                continue
-
-            try:
-                logger.info(f"Trying provider: {provider_name}")
-                result = await provider.generate(prompt, **kwargs)
-                logger.info(f"Success with provider: {provider_name}")
-                return result
-            except Exception as e:
-                logger.warning(f"Provider {provider_name} failed: {e}")
-                last_error = e
-                continue
+        launch_next()
+        try:
+            while pending:
+                timeout = self._hedge_timeout(*latest, hedge_delay) if latest else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 对冲：当前请求都还没返回，并行追加下一个提供商；没有可追加的就只等待结果
+                    if not launch_next():
+                        latest.clear()
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    if task.exception() is None:
+                        logger.info(f"Success with provider: {name}")
+                        return task.result()
+                    logger.warning(f"Provider {name} failed: {task.exception()}")
+                    last_error = task.exception()
+                    launch_next()
+        finally:
+            for task in pending:
+                task.cancel()
 
         raise Exception(f"All providers failed. Last error: {last_error}")
 
+    def _hedge_timeout(self, provider: LLMProvider, started: float, hedge_delay: float = None) -> Optional[float]:
+        """距离追加下一个提供商还需等待的秒数；None表示不对冲（只等待完成或失败）"""
+        if hedge_delay is None:
+            expected = self._latency.get(provider)
+            if expected is None or settings.LLM_HEDGE_LATENCY_MULTIPLIER <= 0:
+                return None
+            hedge_delay = expected * settings.LLM_HEDGE_LATENCY_MULTIPLIER
+        return max(hedge_delay - (time.monotonic() - started), 0.0)
+
     async def generate_parallel(self, prompt: str, providers: List[str] = None, **kwargs) -> Dict[str, str]:
         """并行生成（用于对比）"""
         if not providers:
@@ -490,22 +672,108 @@ class MultiModelManager:
                                       prompt: str, **kwargs) -> str:
         """使用特定提供商生成"""
         try:
-            return await provider.generate(prompt, **kwargs)
+            return await self._generate_cached(provider, prompt, **kwargs)
         except Exception as e:
             logger.error(f"Provider {name} error: {e}")
             raise
 
+    async def _generate_cached(self, provider: LLMProvider, prompt: str,
+                               use_cache: bool = None, **kwargs) -> str:
+        """带响应缓存和并发去重的生成
+
+        默认只缓存温度不高于LLM_CACHE_MAX_TEMPERATURE的调用（输出稳定），
+        use_cache=True/False 可强制开启或关闭。
+        """
+        if use_cache is None:
+            use_cache = kwargs.get('temperature', provider.temperature) <= settings.LLM_CACHE_MAX_TEMPERATURE
+        if not use_cache:
+            return await self._timed_generate(provider, prompt, kwargs)
+
+        key = self._response_cache_key(provider, prompt, kwargs)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.create_task(self._generate_and_store(key, provider, prompt, kwargs))
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget_inflight(key, entry))
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield：某个等待方被取消时不影响其他等待同一结果的请求
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                # 最后一个等待方也离开了（如对冲中落败的请求被取消），取消上游调用；
+                # 立即移出进行中列表，之后的相同请求重新发起调用
+                self._forget_inflight(key, entry)
+                task.cancel()
+
+    def _forget_inflight(self, key: str, entry: list) -> None:
+        """从进行中列表移除该请求（键已被新的请求占用时保持不变）"""
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    async def _generate_and_store(self, key: str, provider: LLMProvider, prompt: str, kwargs: Dict) -> str:
+        result = await self._timed_generate(provider, prompt, kwargs)
+        if self.cache is not None:
+            self.cache.set(key, result, settings.RESULT_CACHE_TTL)
+        return result
+
+    async def _timed_generate(self, provider: LLMProvider, prompt: str, kwargs: Dict) -> str:
+        """调用提供商并更新耗时的指数移动平均（缓存命中不计入）"""
+        start = time.perf_counter()
+        try:
+            result = await provider.generate(prompt, **kwargs)
+        except asyncio.CancelledError:
+            # 被对冲请求取代：实际耗时至少为已等待的时间
+            self._record_latency(provider, time.perf_counter() - start)
+            raise
+        self._record_latency(provider, time.perf_counter() - start)
+        return result
+
+    def _record_latency(self, provider: LLMProvider, elapsed: float, alpha: float = 0.2):
+        previous = self._latency.get(provider)
+        self._latency[provider] = elapsed if previous is None else previous + alpha * (elapsed - previous)
+
+    @staticmethod
+    def _response_cache_key(provider: LLMProvider, prompt: str, kwargs: Dict) -> str:
+        """响应缓存键：提供商、模型、提示词及生成参数的SHA-256"""
+        payload = json.dumps(
+            {"provider": provider.name, "model": provider.model, "prompt": prompt, "params": kwargs},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return "llm_response:" + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
     def estimate_total_cost(self, text: str, output_length: int = 2000) -> Dict[str, float]:
-        """估算所有提供商的成本"""
+        """估算所有提供商的成本（计数方式相同的提供商只计数一次）"""
         costs = {}
+        token_counts: Dict[str, int] = {}
         for name, provider in self.providers.items():
-            input_tokens = provider.count_tokens(text)
+            key = provider.token_counter_key
+            if key is None:
+                input_tokens = provider.count_tokens(text)
+            elif key in token_counts:
+                input_tokens = token_counts[key]
+            else:
+                input_tokens = token_counts[key] = provider.count_tokens(text)
             output_tokens = output_length  # 估算
             cost = provider.estimate_cost(input_tokens, output_tokens)
             costs[name] = round(cost, 4)
 
         return costs
 
+    async def aclose(self):
+        """关闭所有提供商的连接（应用关闭时调用）"""
+        await asyncio.gather(
+            *(provider.aclose() for provider in self.providers.values()),
+            return_exceptions=True
+        )
+
 
 # ==================== 智能路由器 ====================
 
@@ -591,6 +859,8 @@ async def main():
     creative_result = await router.route_request("creative", prompt)
     print("\nRouted result:", creative_result[:100])
 
+    await manager.aclose()
+
 
 if __name__ == "__main__":
     import os
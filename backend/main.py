@@ -1,19 +1,20 @@
 import asyncio
 import json
 import uuid
+import orjson
 import logging
 from datetime import datetime
 from typing import Dict, List, Optional
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import ORJSONResponse, FileResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, aclosing
 import uvicorn
 
 # 导入配置和模型
-from config import settings, NOVEL_CONFIG
+from config import settings, GENRES, NOVEL_CONFIG_JSON
 from models import (
     NovelRequest, TaskResponse, TaskStatus, NovelResult,
     ExportRequest, ExportResult, StoryTemplate, SystemStats,
@@ -21,6 +22,10 @@ from models import (
 )
 from agent_novel_generator import AgentNovelGenerator
 from redis_cache import RedisCache
+from db_operations import (
+    start_novel_views_flusher, stop_novel_views_flusher,
+    start_generation_log_writer, stop_generation_log_writer
+)
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
@@ -29,7 +34,11 @@ logger = logging.getLogger(__name__)
 # 全局变量
 novel_generator = None
 cache = None
-tasks_db = {}  # 临时存储，生产环境应使用Redis或数据库
+
+# 任务统计计数器名称（见 RedisCache.incr_counter）
+TASK_STATS = "task_stats"
+TASK_GENRE_STATS = "task_genre"
+TASK_STYLE_STATS = "task_style"
 
 
 @asynccontextmanager
@@ -53,15 +62,24 @@ async def lifespan(app: FastAPI):
             password=settings.REDIS_PASSWORD if settings.REDIS_PASSWORD else None
         )
         logger.info("✅ Redis缓存连接成功")
+        if settings.TASK_TTL > 0:
+            # 过期的任务不会扣减状态计数，启动时按现存任务重建
+            cache.rebuild_task_status_counters()
+        # 浏览量先在Redis中累加，定期批量写回数据库
+        start_novel_views_flusher(cache)
     except Exception as e:
         logger.warning(f"⚠️ Redis连接失败，将使用内存存储: {e}")
         cache = None
 
+    # 生成日志先放入内存队列，由后台线程批量写入数据库
+    start_generation_log_writer()
+
     # 初始化小说生成器
     try:
         novel_generator = AgentNovelGenerator(
             api_key=settings.OPENAI_API_KEY,
-            base_url=settings.OPENAI_BASE_URL
+            base_url=settings.OPENAI_BASE_URL,
+            cache=cache
         )
         logger.info("✅ AI小说生成器初始化成功")
     except Exception as e:
@@ -73,6 +91,10 @@ async def lifespan(app: FastAPI):
 
     # 关闭时清理
     logger.info("🔄 应用关闭，清理资源...")
+    if novel_generator is not None:
+        await novel_generator.aclose()
+    await asyncio.to_thread(stop_novel_views_flusher)
+    await asyncio.to_thread(stop_generation_log_writer)
 
 
 # 创建FastAPI应用
@@ -81,6 +103,8 @@ app = FastAPI(
     version=settings.APP_VERSION,
     description="基于AI Agent协作的智能小说生成系统",
     lifespan=lifespan,
+    # 响应统一用orjson序列化（比标准库json快，datetime等类型原生支持）
+    default_response_class=ORJSONResponse,
     docs_url="/docs" if settings.APP_DEBUG else None,
     redoc_url="/redoc" if settings.APP_DEBUG else None
 )
@@ -112,6 +136,13 @@ def get_cache() -> Optional[RedisCache]:
     return cache
 
 
+def require_cache() -> RedisCache:
+    """任务数据统一保存在缓存中（多个进程共享，重启不丢失），缓存不可用时无法受理任务"""
+    if cache is None:
+        raise HTTPException(status_code=503, detail="任务存储服务暂不可用")
+    return cache
+
+
 def check_rate_limit(user_id: str = "anonymous"):
     """检查速率限制"""
     if cache:
@@ -137,6 +168,7 @@ async def root():
             "result": "/api/novel/result/{task_id}",
             "export": "/api/novel/export/{task_id}",
             "templates": "/api/templates",
+            "config": "/api/config",
             "stats": "/api/stats",
             "docs": "/docs" if settings.APP_DEBUG else None
         },
@@ -186,6 +218,7 @@ async def generate_novel(
         request: NovelRequest,
         background_tasks: BackgroundTasks,
         generator: AgentNovelGenerator = Depends(get_novel_generator),
+        task_cache: RedisCache = Depends(require_cache),
         _: bool = Depends(check_rate_limit)
 ):
     """创建小说生成任务"""
@@ -216,10 +249,14 @@ async def generate_novel(
         )
 
         # 保存任务
-        task_dict = task.dict()
-        tasks_db[task_id] = task_dict
-        if cache:
-            cache.set_task(task_id, task_dict)
+        task_cache.set_task(task_id, task.dict())
+        task_cache.record_task_transition(None, NovelStatus.PENDING.value)
+
+        # 统计计数器：/api/stats 直接读取，不遍历任务
+        task_cache.incr_counter(TASK_STATS, "total")
+        if request.genre:
+            task_cache.incr_counter(TASK_GENRE_STATS, request.genre.value)
+        task_cache.incr_counter(TASK_STYLE_STATS, request.style.value)
 
         # 在后台执行生成任务
         background_tasks.add_task(
@@ -272,7 +309,7 @@ async def process_novel_generation(task_id: str, request: NovelRequest,
         result = await generator.generate_novel(request, task_id)
 
         # 保存结果
-        update_task_in_storage(task_id, {
+        task_data = update_task_in_storage(task_id, {
             "status": NovelStatus.COMPLETED.value,
             "progress": 100,
             "current_stage": "创作完成！",
@@ -281,6 +318,15 @@ async def process_novel_generation(task_id: str, request: NovelRequest,
             "updated_at": datetime.now().isoformat()
         })
 
+        if cache:
+            stats = result.generation_stats
+            cache.incr_counter(TASK_STATS, "completed")
+            cache.incr_counter(TASK_STATS, "generation_seconds", int(round(stats.get("total_time", 0))))
+            cache.incr_counter(TASK_STATS, "total_words", int(stats.get("total_words", 0)))
+            cache.incr_counter(TASK_STATS, "iterations", int(task_data.get("current_iteration", 0)))
+            if "collaboration_messages" in stats:
+                cache.incr_counter(TASK_STATS, "collaborations")
+
         logger.info(f"✅ 任务完成: {task_id}")
         logger.info(f"   标题: {result.title}")
         logger.info(f"   字数: {result.generation_stats.get('total_words', 0)}")
@@ -293,28 +339,34 @@ async def process_novel_generation(task_id: str, request: NovelRequest,
             "error": str(e),
             "updated_at": datetime.now().isoformat()
         })
+        if cache:
+            cache.incr_counter(TASK_STATS, "failed")
 
 
-def update_task_in_storage(task_id: str, updates: Dict):
-    """更新任务存储"""
-    if task_id in tasks_db:
-        tasks_db[task_id].update(updates)
+def update_task_in_storage(task_id: str, updates: Dict) -> Dict:
+    """更新任务存储，返回更新后的任务数据"""
+    if not cache:
+        return updates
+
+    task_data = cache.get_task(task_id) or {}
+    old_status = task_data.get("status")
+    task_data.update(updates)
+    cache.set_task(task_id, task_data)
+    if "status" in updates:
+        cache.record_task_transition(old_status, updates["status"])
+    cache.publish_task_progress(task_id, task_data)
+    return task_data
 
-    if cache:
-        task_data = cache.get_task(task_id) or {}
-        task_data.update(updates)
-        cache.set_task(task_id, task_data)
+
+def load_task(task_id: str) -> Optional[Dict]:
+    """读取任务数据"""
+    return cache.get_task(task_id) if cache else None
 
 
 @app.get("/api/novel/status/{task_id}", response_model=TaskStatus)
 async def get_task_status(task_id: str):
     """查询任务状态"""
-    # 先从内存查找
-    task_data = tasks_db.get(task_id)
-
-    # 再从Redis查找
-    if not task_data and cache:
-        task_data = cache.get_task(task_id)
+    task_data = load_task(task_id)
 
     if not task_data:
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -341,12 +393,32 @@ async def get_task_status(task_id: str):
         raise HTTPException(status_code=500, detail="状态数据格式错误")
 
 
+@app.get("/api/novel/stream/{task_id}")
+async def stream_task_status(task_id: str):
+    """以SSE推送任务进度（一个长连接代替反复轮询 /api/novel/status），任务完成或失败后结束"""
+    if not load_task(task_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    finished = {NovelStatus.COMPLETED.value, NovelStatus.FAILED.value}
+
+    async def event_stream():
+        async with aclosing(cache.listen_task_progress(task_id)) as updates:
+            async for snapshot in updates:
+                yield b"data: " + orjson.dumps(snapshot) + b"\n\n"
+                if snapshot["status"] in finished:
+                    break
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/api/novel/result/{task_id}", response_model=NovelResult)
 async def get_novel_result(task_id: str):
     """获取生成结果"""
-    task_data = tasks_db.get(task_id)
-    if not task_data and cache:
-        task_data = cache.get_task(task_id)
+    task_data = load_task(task_id)
 
     if not task_data:
         raise HTTPException(status_code=404, detail="任务不存在")
@@ -372,9 +444,7 @@ async def get_novel_result(task_id: str):
 async def export_novel(task_id: str, export_request: ExportRequest):
     """导出小说"""
     # 获取任务结果
-    task_data = tasks_db.get(task_id)
-    if not task_data and cache:
-        task_data = cache.get_task(task_id)
+    task_data = load_task(task_id)
 
     if not task_data or task_data["status"] != NovelStatus.COMPLETED.value:
         raise HTTPException(status_code=400, detail="小说尚未生成完成")
@@ -604,20 +674,26 @@ def export_to_epub(novel: NovelResult) -> str:
 
 # ==================== 模板和统计API ====================
 
+@app.get("/api/config")
+async def get_novel_config():
+    """获取小说生成配置（类型、写作风格等），直接返回启动时预先序列化的JSON"""
+    return Response(content=NOVEL_CONFIG_JSON, media_type="application/json")
+
+
 @app.get("/api/templates", response_model=List[StoryTemplate])
 async def get_templates():
     """获取故事模板"""
     templates = []
 
     # 基础类型模板
-    for genre_key, genre_info in NOVEL_CONFIG["genres"].items():
+    for genre_key, genre_info in GENRES.items():
         template = StoryTemplate(
             id=genre_key,
-            name=genre_info["name"],
-            description=genre_info["description"],
+            name=genre_info.name,
+            description=genre_info.description,
             genre=genre_key,
             keywords=["推荐", "热门"],
-            example_theme=f"一个关于{genre_info['name']}的精彩故事...",
+            example_theme=f"一个关于{genre_info.name}的精彩故事...",
             popularity_score=0.8
         )
         templates.append(template)
@@ -688,59 +764,26 @@ async def get_templates():
 
 @app.get("/api/stats", response_model=SystemStats)
 async def get_stats():
-    """获取系统统计信息"""
-    # 统计任务状态
-    completed = len([t for t in tasks_db.values() if t["status"] == NovelStatus.COMPLETED.value])
-    failed = len([t for t in tasks_db.values() if t["status"] == NovelStatus.FAILED.value])
-    pending = len([t for t in tasks_db.values() if t["status"] in [
-        NovelStatus.PENDING.value, NovelStatus.PLANNING.value,
-        NovelStatus.OUTLINING.value, NovelStatus.WRITING.value,
-        NovelStatus.REVIEWING.value, NovelStatus.POLISHING.value
-    ]])
-
-    total_tasks = len(tasks_db)
+    """获取系统统计信息（读取任务创建和结束时累加的计数器）"""
+    counters = cache.get_counters(TASK_STATS) if cache else {}
+    status_counts = cache.get_counters(RedisCache.TASK_STATUS_COUNTER) if cache else {}
+    genre_stats = cache.get_counters(TASK_GENRE_STATS) if cache else {}
+    style_stats = cache.get_counters(TASK_STYLE_STATS) if cache else {}
+
+    total_tasks = counters.get("total", 0)
+    completed = counters.get("completed", 0)
+    failed = counters.get("failed", 0)
+    # 各处理阶段（等待、策划、写作、审核等）当前的任务数之和
+    pending = sum(
+        max(count, 0) for status, count in status_counts.items()
+        if status not in (NovelStatus.COMPLETED.value, NovelStatus.FAILED.value)
+    )
     success_rate = f"{(completed / total_tasks * 100):.1f}%" if total_tasks > 0 else "0%"
 
-    # 按类型统计
-    genre_stats = {}
-    style_stats = {}
-    total_generation_time = 0
-    collaboration_count = 0
-    total_iterations = 0
-    total_words = 0
-
-    for task_data in tasks_db.values():
-        request_data = task_data.get("request", {})
-        result_data = task_data.get("result", {})
-
-        # 类型统计
-        if "genre" in request_data and request_data["genre"]:
-            genre = request_data["genre"]
-            genre_stats[genre] = genre_stats.get(genre, 0) + 1
-
-        if "style" in request_data:
-            style = request_data["style"]
-            style_stats[style] = style_stats.get(style, 0) + 1
-
-        # 性能统计
-        if result_data and "generation_stats" in result_data:
-            stats = result_data["generation_stats"]
-            if "total_time" in stats:
-                total_generation_time += stats["total_time"]
-            if "collaboration_messages" in stats:
-                collaboration_count += 1
-            if "total_words" in stats:
-                total_words += stats["total_words"]
-
-        # 迭代统计
-        if "current_iteration" in task_data:
-            total_iterations += task_data["current_iteration"]
-
     # 计算平均值
-    avg_generation_time = total_generation_time / completed if completed > 0 else None
-    avg_iterations = total_iterations / total_tasks if total_tasks > 0 else 1.0
-    collaboration_rate = collaboration_count / total_tasks if total_tasks > 0 else 0.0
-    avg_words = total_words / completed if completed > 0 else None
+    avg_generation_time = counters.get("generation_seconds", 0) / completed if completed > 0 else None
+    avg_iterations = counters.get("iterations", 0) / total_tasks if total_tasks > 0 else 1.0
+    collaboration_rate = counters.get("collaborations", 0) / total_tasks if total_tasks > 0 else 0.0
 
     return SystemStats(
         total_tasks=total_tasks,
@@ -761,35 +804,16 @@ async def get_stats():
 
 @app.get("/api/tasks", response_model=List[Dict])
 async def get_task_list(status: Optional[str] = None, limit: int = 20, offset: int = 0):
-    """获取任务列表"""
-    all_tasks = list(tasks_db.values())
-
-    # 状态过滤
-    if status:
-        all_tasks = [task for task in all_tasks if task.get("status") == status]
-
-    # 排序
-    all_tasks.sort(key=lambda x: x.get("created_at", ""), reverse=True)
-
-    # 分页
-    paginated_tasks = all_tasks[offset:offset + limit]
-
-    return paginated_tasks
+    """获取任务列表（按创建时间倒序分页）"""
+    return cache.get_task_list(status=status, limit=limit, offset=offset) if cache else []
 
 
 @app.delete("/api/novel/{task_id}")
 async def delete_task(task_id: str):
     """删除任务"""
-    if task_id not in tasks_db:
+    if not cache or not cache.delete_task(task_id):
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    # 从内存删除
-    del tasks_db[task_id]
-
-    # 从Redis删除
-    if cache:
-        cache.delete(f"task:{task_id}")
-
     logger.info(f"🗑️ 删除任务: {task_id}")
 
     return {"message": "任务已删除", "task_id": task_id}
@@ -800,7 +824,7 @@ async def delete_task(task_id: str):
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
     """HTTP异常处理"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "error": exc.detail,
@@ -815,7 +839,7 @@ async def http_exception_handler(request, exc):
 async def general_exception_handler(request, exc):
     """通用异常处理"""
     logger.error(f"❌ 未处理的异常: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "服务器内部错误",
@@ -87,6 +87,7 @@ class AgentResponse(BaseModel):
     suggestions: Optional[List[str]] = None
     next_action: Optional[str] = None
     metadata: Dict[str, Any] = Field(default_factory=dict)
+    obj: Optional[Any] = None  # 已校验的结果对象（大纲/章节），调用方直接使用，无需再解析content
 
 
 # ==================== 响应模型 ====================
@@ -171,6 +172,7 @@ class Chapter(BaseModel):
     title: str
     content: str
     word_count: int
+    summary: Optional[str] = None  # 剧情摘要，用于后续章节的前情提要
 
     # 质量指标
     readability_score: Optional[float] = None
@@ -9,6 +9,7 @@ import json
 from datetime import datetime
 from prompt_templates import PromptTemplates
 from models import NovelRequest, NovelStatus
+from text_utils import count_words
 
 
 class NovelGenerator:
@@ -171,10 +172,7 @@ class NovelGenerator:
 
     def count_words(self, chapters: List[Dict]) -> int:
         """统计字数"""
-        total = 0
-        for chapter in chapters:
-            total += len(chapter["content"].split())
-        return total
+        return sum(count_words(chapter["content"]) for chapter in chapters)
 
     def count_tokens(self, chapters: List[Dict]) -> int:
         """统计tokens"""
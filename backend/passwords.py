@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+
+from config import settings
+
+# argon2id：同等安全强度下比默认轮数的bcrypt更快；参数写在哈希串中，调整后旧哈希仍可校验
+_hasher = PasswordHasher(
+    time_cost=settings.PASSWORD_HASH_TIME_COST,
+    memory_cost=settings.PASSWORD_HASH_MEMORY_COST,
+    parallelism=2
+)
+
+# 哈希计算专用线程池：argon2与bcrypt计算时都会释放GIL，线程即可并行利用多核，
+# 且不会与asyncio.to_thread的默认线程池中其他阻塞任务互相排队
+_HASH_POOL = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="password-hash")
+
+# 历史bcrypt哈希的前缀（$2a$/$2b$/$2y$）
+_BCRYPT_PREFIX = "$2"
+
+
+def hash_password(password: str) -> str:
+    """生成密码哈希（argon2id）"""
+    return _hasher.hash(password)
+
+
+def configure_password_hasher(time_cost: int, memory_cost: int = None) -> None:
+    """替换新哈希使用的argon2参数（如启动时读取系统配置中的校准结果）"""
+    global _hasher
+    _hasher = PasswordHasher(
+        time_cost=time_cost,
+        memory_cost=memory_cost or settings.PASSWORD_HASH_MEMORY_COST,
+        parallelism=2
+    )
+
+
+def calibrate_time_cost(target_ms: float = 250, memory_cost: int = None, max_time_cost: int = 10) -> int:
+    """测量本机哈希耗时，返回单次哈希不超过target_ms的最大time_cost（至少为1）"""
+    memory_cost = memory_cost or settings.PASSWORD_HASH_MEMORY_COST
+    chosen = 1
+    for time_cost in range(1, max_time_cost + 1):
+        hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=2)
+        start = time.perf_counter()
+        hasher.hash("calibration-password")
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        chosen = time_cost
+    return chosen
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    """校验密码，兼容旧的bcrypt哈希
+
+    明文只编码一次，两种算法都直接使用该bytes；哈希串为纯ASCII，按ASCII编码即可。
+    """
+    secret = password.encode('utf-8')
+    if password_hash.startswith(_BCRYPT_PREFIX):
+        return bcrypt.checkpw(secret, password_hash.encode('ascii'))
+    try:
+        return _hasher.verify(password_hash, secret)
+    except (VerificationError, InvalidHashError):
+        return False
+
+
+async def hash_password_async(password: str) -> str:
+    """在哈希线程池中生成密码哈希，供async路由使用，不阻塞事件循环"""
+    return await asyncio.get_running_loop().run_in_executor(_HASH_POOL, hash_password, password)
+
+
+async def check_password_async(password: str, password_hash: str) -> bool:
+    """在哈希线程池中校验密码，供async路由使用"""
+    return await asyncio.get_running_loop().run_in_executor(_HASH_POOL, check_password, password, password_hash)
@@ -1,38 +1,38 @@
 from typing import Dict, List
 import json
 from models import NovelRequest, ChapterOutline, NovelOutline, Chapter
-from config import NOVEL_CONFIG, AGENT_ROLES
+from config import GENRES, WRITING_STYLES, AGENT_ROLE_CONFIGS
 
 
 class PromptTemplates:
     """提示词模板管理类"""
 
     def __init__(self):
-        self.genre_config = NOVEL_CONFIG["genres"]
-        self.style_config = NOVEL_CONFIG["writing_styles"]
-        self.agent_config = AGENT_ROLES
+        self.genre_config = GENRES
+        self.style_config = WRITING_STYLES
+        self.agent_config = AGENT_ROLE_CONFIGS
 
     def get_outline_prompt(self, request: NovelRequest) -> str:
         """获取大纲生成提示词"""
-        genre_info = self.genre_config.get(request.genre.value if request.genre else "urban_romance", {})
-        style_info = self.style_config.get(request.style.value, {})
+        genre_info = self.genre_config.get(request.genre.value if request.genre else "urban_romance")
+        style_info = self.style_config.get(request.style.value)
 
         prompt = f"""
 你是一位资深的小说策划编辑，具有丰富的故事创作和结构设计经验。请为以下需求创作一个完整的中篇小说大纲。
 
 **创作需求分析：**
 - 核心主题：{request.theme}
-- 故事类型：{request.genre.value if request.genre else "自动判断"} - {genre_info.get("description", "")}
+- 故事类型：{request.genre.value if request.genre else "自动判断"} - {genre_info.description if genre_info else ""}
 - 写作风格：{request.style.value}
 - 目标字数：{request.word_count:,}字
 - 章节规划：{request.chapter_count}章
 - 目标读者：{request.target_audience}
 
 **类型特色要求：**
-{json.dumps(genre_info.get("style_prompts", {}), ensure_ascii=False, indent=2)}
+{genre_info.style_prompts_json if genre_info else "{}"}
 
 **风格特点：**
-{json.dumps(style_info.get("characteristics", []), ensure_ascii=False)}
+{style_info.characteristics_text if style_info else ""}
 
 请生成严格的JSON格式大纲，必须包含以下完整结构：
 
@@ -592,16 +592,16 @@ class PromptTemplates:
 
     def get_agent_collaboration_prompt(self, agent_role: str, context: Dict) -> str:
         """获取Agent协作提示词"""
-        agent_info = self.agent_config.get(agent_role, {})
+        agent_info = self.agent_config.get(agent_role)
 
         base_prompt = f"""
-你是{agent_info.get('name', agent_role)}，{agent_info.get('description', '')}
+你是{agent_info.name if agent_info else agent_role}，{agent_info.description if agent_info else ''}
 
 **你的职责：**
-{chr(10).join(['- ' + resp for resp in agent_info.get('responsibilities', [])])}
+{agent_info.responsibilities_text if agent_info else ''}
 
 **工作风格：**
-{agent_info.get('prompt_style', '')}
+{agent_info.prompt_style if agent_info else ''}
 
 **协作要求：**
 - 与其他AI团队成员协作
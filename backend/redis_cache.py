@@ -1,11 +1,13 @@
+import asyncio
 import redis
+import redis.asyncio
 import json
 import pickle
 import hashlib
 import uuid
 import time
 import logging
-from typing import Any, Optional, Dict, List, Union
+from typing import Any, Optional, Dict, List, Tuple, Union, AsyncGenerator
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from contextlib import contextmanager
@@ -32,6 +34,9 @@ class CacheMetrics:
 class RedisCache:
     """增强版Redis缓存管理器"""
 
+    # 按状态统计当前任务数的计数器名称（见 record_task_transition）
+    TASK_STATUS_COUNTER = "task_status"
+
     def __init__(self, host: str = None, port: int = None, db: int = None,
                  password: str = None, **kwargs):
         """初始化Redis连接"""
@@ -54,6 +59,9 @@ class RedisCache:
             'health_check_interval': 30,
         }
 
+        self._pool_kwargs = pool_kwargs
+        self._async_client = None
+
         try:
             self.connection_pool = redis.ConnectionPool(**pool_kwargs)
             self.redis_client = redis.Redis(connection_pool=self.connection_pool)
@@ -279,10 +287,18 @@ class RedisCache:
 
     # ==================== 任务管理 ====================
 
+    @staticmethod
+    def _task_expiry(expire: Optional[int]) -> Tuple[Optional[int], float]:
+        """任务数据的过期时间：返回 (Redis的ex参数, 内存后备的过期时刻)；
+        未指定时使用TASK_TTL，不大于0表示不过期（每条任务都含完整的生成结果，不建议关闭过期）"""
+        expire = expire or settings.TASK_TTL
+        if expire and expire > 0:
+            return expire, time.time() + expire
+        return None, float('inf')
+
     def set_task(self, task_id: str, task_data: Dict, expire: int = None) -> bool:
-        """设置任务数据"""
+        """设置任务数据（默认按TASK_TTL保存，见 _task_expiry）"""
         key = self._make_key("task", task_id)
-        expire = expire or 7200  # 任务默认保存2小时
 
         # 添加时间戳
         task_data = task_data.copy()
@@ -290,13 +306,21 @@ class RedisCache:
 
         try:
             with self._handle_redis_error() as client:
+                ex, expires_at = self._task_expiry(expire)
                 if client:
-                    serialized = self._serialize(task_data)
-                    return bool(client.setex(key, expire, serialized))
+                    index_key = self._make_key("task_index", "created")
+                    pipe = client.pipeline(transaction=True)
+                    pipe.set(key, self._serialize(task_data), ex=ex)
+                    # 按创建时间排序的任务索引（NX：更新任务时不改变排序分值）
+                    pipe.zadd(index_key, {task_id: self._task_created_score(task_data)}, nx=True)
+                    if ex:
+                        # 顺带移除创建时间早于过期时长的索引项，索引不会无限增长
+                        pipe.zremrangebyscore(index_key, "-inf", time.time() - ex)
+                    return bool(pipe.execute()[0])
                 else:
                     self._fallback_cache[key] = {
                         'value': task_data,
-                        'expires_at': time.time() + expire
+                        'expires_at': expires_at
                     }
                     return True
 
@@ -344,19 +368,266 @@ class RedisCache:
 
         return self.set_task(task_id, task)
 
-    def get_task_list(self, status: str = None, limit: int = 100) -> List[Dict]:
-        """获取任务列表"""
-        pattern = self._make_key("task", "*")
+    def update_task_status_and_message(self, task_id: str, status: str, progress: int = None,
+                                       message: str = None, error: str = None,
+                                       expire: int = None) -> bool:
+        """更新任务状态与当前阶段（单次读取 + MULTI/EXEC 事务写入）"""
+        key = self._make_key("task", task_id)
+        ex, expires_at = self._task_expiry(expire)
+
+        def apply(task: Dict) -> None:
+            now = datetime.now().isoformat()
+            task['status'] = status
+            task['updated_at'] = now
+            task['cached_at'] = now
+            if progress is not None:
+                task['progress'] = progress
+            if error is not None:
+                task['error'] = error
+            if message:
+                task['current_stage'] = message
+
+        try:
+            with self._handle_redis_error() as client:
+                if client:
+                    updated = []
+
+                    # WATCH保证章节并发更新时不会互相覆盖
+                    def txn(pipe):
+                        value = pipe.get(key)
+                        task = self._deserialize(value) if value else None
+                        if not task:
+                            return False
+                        old_status = task.get('status')
+                        apply(task)
+                        pipe.multi()
+                        pipe.set(key, self._serialize(task), ex=ex)
+                        updated[:] = [old_status, task]
+                        return True
+
+                    if not client.transaction(txn, key, value_from_callable=True):
+                        return False
+                    old_status, task = updated
+                    self.record_task_transition(old_status, status)
+                    self.publish_task_progress(task_id, task)
+                    return True
+                else:
+                    cached = self._fallback_cache.get(key)
+                    if not cached or cached['expires_at'] <= time.time():
+                        return False
+                    task = cached['value'].copy()
+                    old_status = task.get('status')
+                    apply(task)
+                    self._fallback_cache[key] = {
+                        'value': task,
+                        'expires_at': expires_at
+                    }
+                    self.record_task_transition(old_status, status)
+                    return True
+
+        except Exception as e:
+            logger.error(f"更新任务状态失败 {task_id}: {e}")
+            return False
+
+    # ==================== 任务进度推送 ====================
+
+    @staticmethod
+    def _progress_snapshot(task: Dict) -> Dict:
+        """推送给前端的任务进度字段（不含生成结果正文）"""
+        return {
+            'status': task.get('status'),
+            'progress': task.get('progress', 0),
+            'current_stage': task.get('current_stage'),
+            'error': task.get('error'),
+            'updated_at': str(task.get('updated_at', '')),
+        }
+
+    def publish_task_progress(self, task_id: str, task: Dict) -> None:
+        """通过Redis Pub/Sub推送任务最新进度（内存后备模式下由订阅方轮询，这里忽略）"""
+        channel = self._make_key("task_progress", task_id)
+        try:
+            with self._handle_redis_error() as client:
+                if client:
+                    client.publish(channel, json.dumps(self._progress_snapshot(task), ensure_ascii=False))
+        except Exception as e:
+            logger.warning(f"推送任务进度失败 {task_id}: {e}")
+
+    def _get_async_client(self) -> "redis.asyncio.Redis":
+        """订阅专用的异步客户端（首次使用时创建），等待消息时不阻塞事件循环"""
+        if self._async_client is None:
+            self._async_client = redis.asyncio.Redis(**self._pool_kwargs)
+        return self._async_client
+
+    async def listen_task_progress(self, task_id: str, poll_interval: float = 15.0) -> AsyncGenerator[Dict, None]:
+        """订阅任务进度，先产出当前状态，之后每次变化产出一次；任务不存在或已过期时结束
+
+        先订阅再读取当前状态，两者之间发布的更新不会丢失。超过poll_interval秒没有消息时
+        重新读取一次任务（补偿发布失败的情况）；Redis不可用时每秒轮询内存后备存储。
+        """
+        last = None
+        pubsub = None
+        channel = self._make_key("task_progress", task_id)
+
+        if self.redis_client is not None:
+            pubsub = self._get_async_client().pubsub()
+            await pubsub.subscribe(channel)
+
+        try:
+            while True:
+                task = self.get_task(task_id)
+                if not task:
+                    return
+                snapshot = self._progress_snapshot(task)
+                if snapshot != last:
+                    last = snapshot
+                    yield snapshot
+
+                if pubsub is None:
+                    await asyncio.sleep(1.0)
+                    continue
+
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=poll_interval)
+                while message is not None:
+                    snapshot = json.loads(message['data'])
+                    if snapshot != last:
+                        last = snapshot
+                        yield snapshot
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=poll_interval)
+        finally:
+            if pubsub is not None:
+                await pubsub.unsubscribe(channel)
+                await pubsub.aclose()
+
+    def record_task_transition(self, old_status: Optional[str], new_status: str) -> None:
+        """任务状态变化时把计数从旧状态移到新状态（新建任务old_status为None），状态未变时不计数"""
+        if old_status == new_status:
+            return
+        if old_status:
+            self.incr_counter(self.TASK_STATUS_COUNTER, old_status, -1)
+        self.incr_counter(self.TASK_STATUS_COUNTER, new_status)
+
+    def delete_task(self, task_id: str) -> bool:
+        """删除任务数据，同时把任务从其状态计数中减去"""
+        key = self._make_key("task", task_id)
+        task = self.get_task(task_id)
+
+        try:
+            with self._handle_redis_error() as client:
+                if client:
+                    pipe = client.pipeline(transaction=True)
+                    pipe.delete(key)
+                    pipe.zrem(self._make_key("task_index", "created"), task_id)
+                    deleted = bool(pipe.execute()[0])
+                else:
+                    deleted = self._fallback_cache.pop(key, None) is not None
+
+        except Exception as e:
+            logger.error(f"删除任务失败 {task_id}: {e}")
+            return False
+
+        # 只有真正删除了数据的一方才扣减计数，并发删除不会重复扣减
+        if deleted and task and task.get('status'):
+            self.incr_counter(self.TASK_STATUS_COUNTER, task['status'], -1)
+        return deleted
+
+    def rebuild_task_status_counters(self) -> Dict[str, int]:
+        """按现存任务重新统计各状态的任务数并覆盖状态计数器
+
+        任务按TASK_TTL过期时不会经过 record_task_transition，计数会偏高，
+        设置了TASK_TTL时在启动时调用以校正。返回重建后的 {status: 任务数}。
+        """
+        counts: Dict[str, int] = {}
+        prefix = self._make_key(f"counter:{self.TASK_STATUS_COUNTER}", "")
+
+        try:
+            with self._handle_redis_error() as client:
+                if client:
+                    index_key = self._make_key("task_index", "created")
+                    batch_size = 500
+                    start = 0
+                    while True:
+                        task_ids = client.zrange(index_key, start, start + batch_size - 1)
+                        if not task_ids:
+                            break
+                        start += batch_size
+                        values = client.mget([self._make_key("task", task_id.decode('utf-8'))
+                                              for task_id in task_ids])
+                        for value in values:
+                            task_data = self._deserialize(value) if value else None
+                            if task_data and task_data.get('status'):
+                                counts[task_data['status']] = counts.get(task_data['status'], 0) + 1
+
+                    stale_keys = list(client.scan_iter(match=prefix + "*", count=1000))
+                    pipe = client.pipeline(transaction=True)
+                    if stale_keys:
+                        pipe.delete(*stale_keys)
+                    for task_status, count in counts.items():
+                        pipe.set(prefix + task_status, count)
+                    pipe.execute()
+                else:
+                    now = time.time()
+                    task_prefix = self._make_key("task", "")
+                    for key, cached in self._fallback_cache.items():
+                        if key.startswith(task_prefix) and cached['expires_at'] > now:
+                            task_status = cached['value'].get('status')
+                            if task_status:
+                                counts[task_status] = counts.get(task_status, 0) + 1
+
+                    if not hasattr(self, '_counter_cache'):
+                        self._counter_cache = {}
+                    for key in [key for key in self._counter_cache if key.startswith(prefix)]:
+                        del self._counter_cache[key]
+                    for task_status, count in counts.items():
+                        self._counter_cache[prefix + task_status] = count
+
+        except Exception as e:
+            logger.error(f"重建任务状态计数失败: {e}")
+
+        return counts
+
+    @staticmethod
+    def _task_created_score(task_data: Dict) -> float:
+        """任务索引的排序分值：创建时间的时间戳"""
+        created_at = task_data.get('created_at')
+        if isinstance(created_at, str):
+            try:
+                created_at = datetime.fromisoformat(created_at)
+            except ValueError:
+                created_at = None
+        return created_at.timestamp() if isinstance(created_at, datetime) else time.time()
+
+    def get_task_list(self, status: str = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+        """按创建时间倒序分页获取任务列表
+
+        Redis中通过有序集合索引（ZREVRANGE）分批读取，只读取需要的任务，不使用KEYS；
+        按状态过滤时持续往后读取，直到凑够offset + limit条。
+        """
         tasks = []
+        wanted = offset + limit
 
         try:
             with self._handle_redis_error() as client:
                 if client:
-                    keys = client.keys(pattern)
-                    for key in keys[:limit]:
-                        task_data = self._deserialize(client.get(key))
-                        if task_data and (not status or task_data.get('status') == status):
-                            tasks.append(task_data)
+                    index_key = self._make_key("task_index", "created")
+                    batch_size = max(wanted, 100)
+                    start = 0
+                    while len(tasks) < wanted:
+                        task_ids = client.zrevrange(index_key, start, start + batch_size - 1)
+                        if not task_ids:
+                            break
+                        start += batch_size
+                        values = client.mget([self._make_key("task", task_id.decode('utf-8'))
+                                              for task_id in task_ids])
+                        expired = []
+                        for task_id, value in zip(task_ids, values):
+                            task_data = self._deserialize(value) if value else None
+                            if task_data is None:
+                                expired.append(task_id)
+                            elif not status or task_data.get('status') == status:
+                                tasks.append(task_data)
+                        if expired:
+                            # 已过期的任务顺便从索引中移除
+                            client.zrem(index_key, *expired)
                 else:
                     # 内存后备方案
                     for key, cached in self._fallback_cache.items():
@@ -365,11 +636,12 @@ class RedisCache:
                                 task_data = cached['value']
                                 if not status or task_data.get('status') == status:
                                     tasks.append(task_data)
+                    tasks.sort(key=self._task_created_score, reverse=True)
 
         except Exception as e:
             logger.error(f"获取任务列表失败: {e}")
 
-        return sorted(tasks, key=lambda x: x.get('created_at', ''), reverse=True)
+        return tasks[offset:wanted]
 
     # ==================== 结果缓存 ====================
 
@@ -508,6 +780,78 @@ class RedisCache:
             logger.error(f"获取Token使用量失败: {e}")
             return 0
 
+    # ==================== 计数器 ====================
+
+    def incr_counter(self, name: str, identifier: str, amount: int = 1) -> int:
+        """累加计数器（Redis INCRBY，原子操作），返回累加后的值"""
+        key = self._make_key(f"counter:{name}", identifier)
+
+        try:
+            with self._handle_redis_error() as client:
+                if client:
+                    return int(client.incrby(key, amount))
+                else:
+                    if not hasattr(self, '_counter_cache'):
+                        self._counter_cache = {}
+
+                    new_total = self._counter_cache.get(key, 0) + amount
+                    self._counter_cache[key] = new_total
+                    return new_total
+
+        except Exception as e:
+            logger.error(f"累加计数器失败 {name}:{identifier}: {e}")
+            return 0
+
+    def pop_counters(self, name: str) -> Dict[str, int]:
+        """取出并清零某类计数器的全部值（用于定期落库），返回 {identifier: 累计值}"""
+        prefix = self._make_key(f"counter:{name}", "")
+        counters = {}
+
+        try:
+            with self._handle_redis_error() as client:
+                if client:
+                    for key in client.scan_iter(match=prefix + "*", count=1000):
+                        # GET与DEL放在同一事务中，期间的INCR不会丢失
+                        pipe = client.pipeline(transaction=True)
+                        pipe.get(key)
+                        pipe.delete(key)
+                        value, _ = pipe.execute()
+                        if value:
+                            counters[key.decode('utf-8')[len(prefix):]] = int(value)
+                else:
+                    counter_cache = getattr(self, '_counter_cache', {})
+                    for key in [key for key in counter_cache if key.startswith(prefix)]:
+                        counters[key[len(prefix):]] = counter_cache.pop(key)
+
+        except Exception as e:
+            logger.error(f"读取计数器失败 {name}: {e}")
+
+        return counters
+
+    def get_counters(self, name: str) -> Dict[str, int]:
+        """读取（不清零）某类计数器的全部值，返回 {identifier: 当前值}"""
+        prefix = self._make_key(f"counter:{name}", "")
+        counters = {}
+
+        try:
+            with self._handle_redis_error() as client:
+                if client:
+                    keys = list(client.scan_iter(match=prefix + "*", count=1000))
+                    if keys:
+                        for key, value in zip(keys, client.mget(keys)):
+                            if value is not None:
+                                counters[key.decode('utf-8')[len(prefix):]] = int(value)
+                else:
+                    counter_cache = getattr(self, '_counter_cache', {})
+                    for key, value in counter_cache.items():
+                        if key.startswith(prefix):
+                            counters[key[len(prefix):]] = value
+
+        except Exception as e:
+            logger.error(f"读取计数器失败 {name}: {e}")
+
+        return counters
+
     # ==================== 分布式锁 ====================
 
     def acquire_lock(self, lock_name: str, timeout: int = 10, expire: int = 30) -> Optional[str]:
@@ -0,0 +1,73 @@
+from sqlalchemy import func, select
+
+from database import Chapter, ChapterVersion, GenerationLog, Novel, User
+from db_operations import DatabaseOperations
+
+
+def _create_user_with_novel(db):
+    user = User(username="writer", email="writer@example.com", password_hash="x")
+    db.add(user)
+    db.flush()
+    novel = Novel(user_id=user.id, title="测试小说", status="completed")
+    db.add(novel)
+    db.flush()
+    return user, novel
+
+
+def _count(db, model):
+    return db.scalar(select(func.count()).select_from(model))
+
+
+def test_delete_novel_removes_child_rows(db_session):
+    user, novel = _create_user_with_novel(db_session)
+    chapter = Chapter(novel_id=novel.id, chapter_number=1, title="第一章", content="正文")
+    db_session.add(chapter)
+    db_session.flush()
+    db_session.add(ChapterVersion(chapter_id=chapter.id, version=1, content="旧正文"))
+    db_session.add(GenerationLog(novel_id=novel.id, user_id=user.id, stage="content", status="success"))
+    db_session.commit()
+    novel_id = novel.id
+    db_session.expunge_all()
+
+    assert DatabaseOperations(db_session).delete_novel(novel_id)
+
+    assert _count(db_session, Chapter) == 0
+    assert _count(db_session, ChapterVersion) == 0
+    assert db_session.scalars(select(GenerationLog.novel_id)).all() == [None]
+
+
+def test_save_novel_content_replaces_chapter_list(db_session):
+    _, novel = _create_user_with_novel(db_session)
+    db_session.commit()
+    ops = DatabaseOperations(db_session)
+    chapters = [
+        {"chapter_number": 1, "title": "第一章", "content": "一", "word_count": 1},
+        {"chapter_number": 2, "title": "第二章", "content": "二", "word_count": 1},
+    ]
+    assert ops.save_novel_content(novel.id, chapters=chapters)
+    second = db_session.scalars(select(Chapter).where(Chapter.chapter_number == 2)).one()
+    db_session.add(ChapterVersion(chapter_id=second.id, version=1, content="旧正文"))
+    db_session.commit()
+
+    assert ops.save_novel_content(novel.id, chapters=chapters[:1])
+
+    assert db_session.scalars(select(Chapter.chapter_number)).all() == [1]
+    assert _count(db_session, ChapterVersion) == 0
+
+
+def test_get_user_statistics_totals(db_session):
+    user, novel = _create_user_with_novel(db_session)
+    db_session.add(Novel(user_id=user.id, title="草稿", status="draft"))
+    db_session.add_all([
+        GenerationLog(novel_id=novel.id, user_id=user.id, stage="outline", status="success", cost=0.5),
+        GenerationLog(novel_id=novel.id, user_id=user.id, stage="content", status="success", cost=1.25),
+    ])
+    db_session.commit()
+
+    stats = DatabaseOperations(db_session).get_user_statistics(user.id)
+
+    assert stats["user_info"]["username"] == "writer"
+    assert stats["novel_stats"]["total_novels"] == 2
+    assert stats["novel_stats"]["completed_novels"] == 1
+    assert stats["usage_stats"]["total_generations"] == 2
+    assert stats["usage_stats"]["total_cost"] == 1.75
@@ -0,0 +1,47 @@
+import functools
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+_WORD_RE = re.compile(r'[\u4e00-\u9fff]|[A-Za-z0-9]+')
+
+
+def count_words(content: str) -> int:
+    """统计字数：每个汉字计一字，连续的英文字母/数字计一词（流式扫描，不构造中间列表）"""
+    return sum(1 for _ in _WORD_RE.finditer(content))
+
+
+def text_digest_cache(maxsize: int):
+    """按文本摘要缓存结果的LRU装饰器，被装饰函数的最后一个参数为文本
+
+    functools.lru_cache会把整段文本作为键保留在内存中（长篇正文每条可达数十KB），
+    这里改用文本的blake2b摘要（16字节）作为键，缓存只保存摘要和结果。
+    """
+    def decorator(func):
+        cache: "OrderedDict[tuple, object]" = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            *prefix, text = args
+            key = (*prefix, hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest())
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    return cache[key]
+            result = func(*args)
+            with lock:
+                cache[key] = result
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator